@@ -1,12 +1,22 @@
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
 import asyncio
+import hashlib
 import json
+import secrets
+import threading
+import uuid
 
 from core.config import settings
 from core.brain import AIBrain, BrainConfig
+from core.registry import BrainRegistry, SharedResources, QuotaExceededError, UnknownAppError
+from core.idempotency import IdempotencyStore, IdempotencyConflictError
+from core.profiling import SamplingProfiler, AllocationTracker
+from core import streaming
+from core.streaming import SendQueue, SlowConsumerError
 
 # Create FastAPI app
 app = FastAPI(
@@ -24,14 +34,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global brain instance
+# Every hosted app's brain, sharing worker pools and other heavy resources
+registry = BrainRegistry(SharedResources(settings.tool_thread_workers, settings.tool_process_workers))
+
+# Brain for the default app (settings.app_name)
 brain: Optional[AIBrain] = None
 
+# Deduplicates client retries that carry an idempotency key
+idempotency = IdempotencyStore(
+    ttl=settings.idempotency_ttl,
+    max_entries=settings.idempotency_max_entries,
+    grace=settings.idempotency_grace
+)
+
+# On-demand diagnostics; idle until an admin endpoint is called
+profiler = SamplingProfiler()
+allocations = AllocationTracker()
+
 # Request/Response models
 class ChatRequest(BaseModel):
     user_id: str
     message: str
     context: Optional[Dict[str, Any]] = None
+    idempotency_key: Optional[str] = None
+    app_id: Optional[str] = None
 
 class ChatResponse(BaseModel):
     response: str
@@ -42,6 +68,104 @@ class ToolInfo(BaseModel):
     name: str
     description: str
 
+# How often /chat checks whether the client is still connected
+DISCONNECT_POLL_INTERVAL = 0.5
+
+def open_stream(user_id: str, message: str, context: Optional[Dict[str, Any]],
+                idempotency_key: Optional[str] = None, app_id: Optional[str] = None):
+    """Start a turn, or attach to / replay the one already run for this key"""
+    app_id = app_id or settings.app_name
+    registry.get(app_id)  # Fail fast on an unknown app, before any stream starts
+    if not idempotency_key:
+        return registry.process(app_id, user_id, message, context)
+    fingerprint = hashlib.sha256(
+        json.dumps([message, context], sort_keys=True, default=str).encode()
+    ).hexdigest()
+    return idempotency.stream(
+        f"{app_id}:{user_id}:{idempotency_key}",
+        lambda: registry.process(app_id, user_id, message, context),
+        fingerprint
+    )
+
+async def collect_response(stream) -> str:
+    """Drain a response stream and return the concatenated text"""
+    response_text = ""
+    try:
+        async for chunk in stream:
+            response_text += chunk
+    finally:
+        await stream.aclose()
+    return response_text
+
+async def run_until_disconnect(request: Request, coro):
+    """Await coro, cancelling it if the HTTP client disconnects first"""
+    task = asyncio.create_task(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
+
+async def stream_to_websocket(sender: SendQueue, stream_id: str, stream) -> Optional[str]:
+    """
+    Queue a full turn for the socket, closing the response stream on exit
+    
+    Returns the full response text if any chunk was dropped by the
+    slow-consumer policy, so the completion frame can carry it instead.
+    """
+    response_text = ""
+    degraded = False
+    try:
+        async for chunk in stream:
+            response_text += chunk
+            if not sender.put({"type": "chunk", "stream_id": stream_id, "content": chunk}):
+                degraded = True
+    finally:
+        await stream.aclose()
+    return response_text if degraded else None
+
+async def run_websocket_stream(sender: SendQueue, stream_id: str, stream):
+    """Run one multiplexed turn: ack, chunks, then completion or error"""
+    try:
+        sender.put({
+            "type": "ack",
+            "stream_id": stream_id,
+            "status": "processing"
+        })
+        full_text = await stream_to_websocket(sender, stream_id, stream)
+        
+        # Send completion, with the whole response if chunks were dropped
+        completion = {
+            "type": "complete",
+            "stream_id": stream_id,
+            "status": "success"
+        }
+        if full_text is not None:
+            completion["content"] = full_text
+        sender.put(completion)
+    except asyncio.CancelledError:
+        if sender.error is None:
+            sender.put({
+                "type": "cancelled",
+                "stream_id": stream_id
+            })
+        raise
+    except SlowConsumerError:
+        pass  # The send queue has already closed the socket
+    except Exception as e:
+        if sender.error is None:
+            sender.put({
+                "type": "error",
+                "stream_id": stream_id,
+                "message": str(e)
+            })
+
 # Startup/Shutdown events
 @app.on_event("startup")
 async def startup_event():
@@ -55,10 +179,22 @@ async def startup_event():
         model_provider=settings.model_provider,
         model_name=settings.model_name,
         temperature=settings.model_temperature,
+        tool_thread_workers=settings.tool_thread_workers,
+        tool_process_workers=settings.tool_process_workers,
+        shared_cache_name=settings.shared_cache_name,
+        shared_cache_slots=settings.shared_cache_slots,
+        shared_cache_slot_size=settings.shared_cache_slot_size,
+        tool_cache_ttl=settings.tool_cache_ttl,
+        response_cache_ttl=settings.response_cache_ttl,
+        snapshot_dir=settings.snapshot_dir,
+        snapshot_interval=settings.snapshot_interval,
+        snapshot_full_every=settings.snapshot_full_every,
     )
     
-    brain = AIBrain(config)
-    await brain.initialize()
+    brain = await registry.register(
+        settings.app_name, config,
+        max_concurrent_requests=settings.app_max_concurrent_requests
+    )
     
     # Register example tools
     from domain.example.tools.calculator import CalculatorTool
@@ -69,8 +205,7 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
-    if brain:
-        await brain.shutdown()
+    await registry.shutdown()
 
 # REST Endpoints
 @app.get("/")
@@ -91,20 +226,24 @@ async def health_check():
     }
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request,
+               idempotency_key: Optional[str] = Header(None)):
     """Process a chat message"""
     if not brain:
         raise HTTPException(status_code=500, detail="Brain not initialized")
     
     try:
-        # Collect full response
-        response_text = ""
-        async for chunk in brain.process(
-            request.user_id,
-            request.message,
-            request.context
-        ):
-            response_text += chunk
+        # Collect full response, abandoning it if the client goes away
+        response_text = await run_until_disconnect(
+            http_request,
+            collect_response(open_stream(
+                request.user_id,
+                request.message,
+                request.context,
+                request.idempotency_key or idempotency_key,
+                request.app_id
+            ))
+        )
         
         return ChatResponse(
             response=response_text,
@@ -112,60 +251,175 @@ async def chat(request: ChatRequest):
             metadata={"status": "success"}
         )
         
+    except HTTPException:
+        raise
+    except QuotaExceededError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except IdempotencyConflictError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except UnknownAppError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/metrics")
+async def metrics():
+    """Runtime counters from every app's brain and the transport layer"""
+    if not brain:
+        raise HTTPException(status_code=500, detail="Brain not initialized")
+    
+    metrics = {"apps": registry.get_metrics()}
+    metrics["idempotency"] = dict(idempotency.metrics)
+    metrics["websocket"] = streaming.get_metrics()
+    return metrics
+
 @app.get("/tools", response_model=List[ToolInfo])
-async def list_tools():
+async def list_tools(app_id: Optional[str] = None):
     """List available tools"""
     if not brain:
         raise HTTPException(status_code=500, detail="Brain not initialized")
     
-    tools = brain.components['tools'].list_tools()
+    try:
+        app_brain = registry.get(app_id or settings.app_name)
+    except UnknownAppError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    tools = app_brain.components['tools'].list_tools()
     return [ToolInfo(**tool) for tool in tools]
 
+# Admin diagnostics
+MAX_PROFILE_SECONDS = 60
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Allow admin endpoints only when a token is configured and matches"""
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(x_admin_token or "", settings.admin_token):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+@app.get("/admin/profile", response_class=PlainTextResponse,
+         dependencies=[Depends(require_admin)])
+async def profile(seconds: float = 10.0, interval_ms: float = 5.0):
+    """Sample the event loop thread and return collapsed stacks for flamegraphs"""
+    if profiler.active:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    
+    loop_thread = threading.get_ident()
+    return await asyncio.to_thread(
+        profiler.profile,
+        loop_thread,
+        min(max(seconds, 0.1), MAX_PROFILE_SECONDS),
+        max(interval_ms, 1.0) / 1000
+    )
+
+@app.post("/admin/allocations/start", dependencies=[Depends(require_admin)])
+async def start_allocation_tracking():
+    """Start tracemalloc; allocations are only traced while this is on"""
+    allocations.start()
+    return {"tracing": True}
+
+@app.post("/admin/allocations/stop", dependencies=[Depends(require_admin)])
+async def stop_allocation_tracking():
+    """Stop tracemalloc and drop the stored baseline"""
+    allocations.stop()
+    return {"tracing": False}
+
+@app.get("/admin/allocations", dependencies=[Depends(require_admin)])
+async def allocation_snapshot(limit: int = 20):
+    """Allocations by component, with a diff against the previous snapshot"""
+    if not allocations.active:
+        raise HTTPException(status_code=409, detail="Allocation tracking is not running")
+    
+    return allocations.snapshot(limit)
+
 # WebSocket for streaming
 @app.websocket("/ws/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: str):
-    """WebSocket endpoint for real-time streaming"""
+    """
+    WebSocket endpoint for real-time streaming
+    
+    Each message may carry a stream_id; up to ws_max_streams turns run
+    concurrently on one socket and every frame is tagged with the
+    stream_id it belongs to. Sending {"type": "cancel", "stream_id": ...}
+    abandons that stream. Messages without a stream_id get one assigned.
+    """
     await websocket.accept()
     
+    # Frames go through a bounded queue so a slow client never blocks generation
+    sender = SendQueue(
+        websocket,
+        max_size=settings.ws_send_queue_size,
+        policy=settings.ws_slow_consumer_policy,
+        stall_threshold=settings.ws_stall_threshold
+    )
+    
+    # stream_id -> task running that turn; the loop below keeps receiving,
+    # so a disconnect or cancel is noticed while responses are generated
+    streams = {}
     try:
         while True:
             # Receive message
             data = await websocket.receive_text()
             message_data = json.loads(data)
+            stream_id = str(message_data.get("stream_id") or uuid.uuid4().hex)
             
-            message = message_data.get("message", "")
-            context = message_data.get("context", {})
+            if message_data.get("type") == "cancel":
+                if stream_id in streams:
+                    streams[stream_id].cancel()
+                continue
             
-            # Send acknowledgment
-            await websocket.send_json({
-                "type": "ack",
-                "status": "processing"
-            })
+            if stream_id in streams:
+                sender.put({
+                    "type": "error",
+                    "stream_id": stream_id,
+                    "message": "Stream is already active"
+                })
+                continue
+            if len(streams) >= settings.ws_max_streams:
+                sender.put({
+                    "type": "error",
+                    "stream_id": stream_id,
+                    "message": "Too many concurrent streams"
+                })
+                continue
             
-            # Stream response
-            async for chunk in brain.process(user_id, message, context):
-                await websocket.send_json({
-                    "type": "chunk",
-                    "content": chunk
+            message = message_data.get("message", "")
+            context = message_data.get("context", {})
+            try:
+                stream = open_stream(
+                    user_id, message, context,
+                    message_data.get("idempotency_key"),
+                    message_data.get("app_id")
+                )
+            except UnknownAppError as e:
+                sender.put({
+                    "type": "error",
+                    "stream_id": stream_id,
+                    "message": str(e)
                 })
+                continue
             
-            # Send completion
-            await websocket.send_json({
-                "type": "complete",
-                "status": "success"
-            })
+            task = asyncio.create_task(run_websocket_stream(sender, stream_id, stream))
+            streams[stream_id] = task
+            task.add_done_callback(lambda _, sid=stream_id: streams.pop(sid, None))
             
     except WebSocketDisconnect:
         print(f"WebSocket disconnected for user: {user_id}")
     except Exception as e:
-        await websocket.send_json({
-            "type": "error",
-            "message": str(e)
-        })
-        await websocket.close()
+        if sender.error is None:
+            sender.put({
+                "type": "error",
+                "message": str(e)
+            })
+            await sender.close(timeout=settings.ws_stall_threshold)
+            await websocket.close()
+    finally:
+        # Abandon every turn still running for this socket
+        running = list(streams.values())
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        await sender.close()
 
 if __name__ == "__main__":
     import uvicorn
@@ -8,6 +8,7 @@ class DatabaseManager:
     def __init__(self, config):
         self.config = config
         self.sessions = {}  # Simple in-memory storage for now
+        self.dirty_sessions = set()  # sessions created since the last snapshot
         
     async def initialize(self):
         """Initialize database connection"""
@@ -23,8 +24,31 @@ class DatabaseManager:
                 "user_id": user_id,
                 "created_at": datetime.utcnow()
             }
+            self.dirty_sessions.add(session_id)
         return self.sessions[session_id]
     
+    def export_state(self, full: bool = True) -> Dict[str, Any]:
+        """Copy sessions for a snapshot; only new ones unless full"""
+        session_ids = list(self.sessions) if full else list(self.dirty_sessions)
+        self.dirty_sessions.clear()
+        return {
+            "sessions": {
+                session_id: {
+                    **self.sessions[session_id],
+                    "created_at": self.sessions[session_id]["created_at"].isoformat()
+                }
+                for session_id in session_ids
+            }
+        }
+    
+    def import_state(self, state: Dict[str, Any]):
+        """Restore sessions from a snapshot"""
+        for session_id, session in state.get("sessions", {}).items():
+            self.sessions[session_id] = {
+                **session,
+                "created_at": datetime.fromisoformat(session["created_at"])
+            }
+    
     async def shutdown(self):
         """Close database connections"""
         pass
@@ -0,0 +1,138 @@
+from typing import Dict, Any, List, Iterator
+from collections import deque
+from itertools import islice
+import json
+import lzma
+import sys
+import zlib
+
+CODECS = {
+    "zlib": (lambda data: zlib.compress(data, 6), zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+def _message_size(msg: Dict[str, Any]) -> int:
+    """Approximate resident size of a message dict and its strings"""
+    return sys.getsizeof(msg) + sum(sys.getsizeof(v) for v in msg.values())
+
+class ConversationHistory:
+    """
+    Two-tier message history for one session
+    
+    The newest messages stay as plain dicts in the hot tier. Once the hot
+    tier overflows, its oldest block_size messages are packed into one
+    compressed cold block, which is only decompressed when something
+    reads that far back. When the total exceeds max_items, the oldest
+    cold block is dropped as a whole.
+    """
+    
+    def __init__(self, max_items: int, hot_size: int = 50,
+                 block_size: int = 50, codec: str = "zlib"):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec '{codec}'")
+        self.max_items = max_items
+        self.hot_size = hot_size
+        self.block_size = block_size
+        self.codec = codec
+        self.hot = deque()
+        self.cold = deque()  # (message count, raw bytes, compressed blob)
+        self.cold_count = 0
+        self._decoded = (None, None)  # last decompressed (blob, messages)
+    
+    def __len__(self) -> int:
+        return self.cold_count + len(self.hot)
+    
+    def append(self, msg: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Add a message, returning any messages evicted from the oldest end"""
+        self.hot.append(msg)
+        if len(self.hot) >= self.hot_size + self.block_size:
+            self._pack_block()
+        return self._evict()
+    
+    def _evict(self) -> List[Dict[str, Any]]:
+        evicted = []
+        while len(self) > self.max_items:
+            if self.cold:
+                count, _, blob = self.cold.popleft()
+                self.cold_count -= count
+                evicted.extend(self._decode(blob))
+            else:
+                evicted.append(self.hot.popleft())
+        return evicted
+    
+    def _pack_block(self):
+        block = [self.hot.popleft() for _ in range(self.block_size)]
+        raw = json.dumps(block, separators=(",", ":")).encode()
+        compress, _ = CODECS[self.codec]
+        self.cold.append((len(block), len(raw), compress(raw)))
+        self.cold_count += len(block)
+    
+    def _decode(self, blob: bytes) -> List[Dict[str, Any]]:
+        """Decompress a cold block, reusing the last one decoded"""
+        if self._decoded[0] is not blob:
+            _, decompress = CODECS[self.codec]
+            self._decoded = (blob, json.loads(decompress(blob)))
+        return self._decoded[1]
+    
+    def get(self, index: int) -> Dict[str, Any]:
+        """Message at index counted from the oldest retained message"""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history index out of range")
+        
+        if index >= self.cold_count:
+            return self.hot[index - self.cold_count]
+        for count, _, blob in self.cold:
+            if index < count:
+                return self._decode(blob)[index]
+            index -= count
+    
+    def recent(self, n: int) -> List[Dict[str, Any]]:
+        """The newest n messages, oldest first"""
+        if n <= len(self.hot):
+            return list(islice(self.hot, len(self.hot) - n, None)) if n > 0 else []
+        return [self.get(i) for i in range(max(len(self) - n, 0), len(self))]
+    
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for _, _, blob in list(self.cold):
+            yield from self._decode(blob)
+        yield from list(self.hot)
+    
+    def export_tiers(self) -> Dict[str, Any]:
+        """Cold blocks as their compressed bytes plus the hot messages, without decoding"""
+        return {"codec": self.codec, "cold": list(self.cold), "hot": list(self.hot)}
+    
+    def load_tiers(self, tiers: Dict[str, Any]):
+        """Restore tiers captured by export_tiers"""
+        if tiers["codec"] != self.codec:
+            # Written under another codec; repack the messages under ours
+            _, decompress = CODECS[tiers["codec"]]
+            for _, _, blob in tiers["cold"]:
+                for msg in json.loads(decompress(blob)):
+                    self.append(msg)
+            for msg in tiers["hot"]:
+                self.append(msg)
+            return
+        
+        self.cold = deque(tuple(block) for block in tiers["cold"])
+        self.cold_count = sum(count for count, _, _ in self.cold)
+        self.hot = deque(tiers["hot"])
+        while len(self.hot) >= self.hot_size + self.block_size:
+            self._pack_block()
+        self._evict()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Message counts, compression ratio and approximate resident bytes"""
+        raw = sum(raw for _, raw, _ in self.cold)
+        compressed = sum(len(blob) for _, _, blob in self.cold)
+        hot_bytes = sum(_message_size(msg) for msg in self.hot)
+        return {
+            "messages": len(self),
+            "hot_messages": len(self.hot),
+            "cold_blocks": len(self.cold),
+            "cold_raw_bytes": raw,
+            "cold_compressed_bytes": compressed,
+            "compression_ratio": round(raw / compressed, 2) if compressed else None,
+            "resident_bytes": hot_bytes + compressed,
+        }
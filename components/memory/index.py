@@ -0,0 +1,85 @@
+from typing import List, Tuple, Optional, Set
+from array import array
+from bisect import bisect_left
+from collections import Counter
+import heapq
+import math
+import re
+
+_TOKEN = re.compile(r"\w+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i if in is it its me my "
+    "of on or so that the this to was we what with you your".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords"""
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+class BM25Index:
+    """
+    Incremental in-process inverted index with BM25 scoring
+    
+    Documents are identified by increasing integer ids, so every posting
+    list stays sorted and is stored as a pair of compact unsigned arrays.
+    """
+    
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}  # term -> (doc ids, term frequencies)
+        self.doc_lengths = {}  # doc id -> token count
+        self.total_length = 0
+    
+    def add(self, doc_id: int, text: str):
+        """Index a document; ids must be added in increasing order"""
+        terms = tokenize(text)
+        self.doc_lengths[doc_id] = len(terms)
+        self.total_length += len(terms)
+        
+        for term, tf in Counter(terms).items():
+            if term not in self.postings:
+                self.postings[term] = (array("I"), array("I"))
+            ids, tfs = self.postings[term]
+            ids.append(doc_id)
+            tfs.append(tf)
+    
+    def remove(self, doc_id: int, text: str):
+        """Drop a document previously added with the same text"""
+        if doc_id not in self.doc_lengths:
+            return
+        self.total_length -= self.doc_lengths.pop(doc_id)
+        
+        for term in set(tokenize(text)):
+            ids, tfs = self.postings[term]
+            pos = bisect_left(ids, doc_id)
+            if pos < len(ids) and ids[pos] == doc_id:
+                del ids[pos]
+                del tfs[pos]
+            if not ids:
+                del self.postings[term]
+    
+    def search(self, query: str, k: int,
+               exclude: Optional[Set[int]] = None) -> List[Tuple[int, float]]:
+        """Return up to k (doc id, score) pairs, best first"""
+        n_docs = len(self.doc_lengths)
+        if not n_docs:
+            return []
+        avg_length = self.total_length / n_docs or 1.0
+        exclude = exclude or set()
+        
+        scores = {}
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            ids, tfs = self.postings[term]
+            df = len(ids)
+            idf = math.log((n_docs - df + 0.5) / (df + 0.5) + 1.0)
+            for doc_id, tf in zip(ids, tfs):
+                if doc_id in exclude:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
@@ -1,6 +1,8 @@
 from typing import Dict, Any, List
-from collections import deque
 import time
+from .summarizer import RollingSummarizer
+from .index import BM25Index
+from .history import ConversationHistory
 
 class MemoryManager:
     """Manages short-term cache and long-term retrieval"""
@@ -8,32 +10,182 @@ class MemoryManager:
     def __init__(self, config):
         self.config = config
         self.conversation_buffer = {}
+        self.indexes = {}  # session_id -> BM25Index over the buffered messages
+        self.message_counts = {}  # session_id -> messages ever added, used as doc ids
+        self.dirty_sessions = set()  # sessions changed since the last snapshot
+        # A finished fold changes the summary, so the session needs snapshotting again
+        self.summarizer = RollingSummarizer(config, on_update=self.dirty_sessions.add)
+        self.snapshot_marks = {}  # session_id -> message count already snapshotted
         
     async def initialize(self):
         """Initialize memory systems"""
         pass
     
+    def _new_history(self) -> ConversationHistory:
+        return ConversationHistory(
+            self.config.max_memory_items,
+            hot_size=self.config.hot_history_size,
+            block_size=self.config.cold_block_size,
+            codec=self.config.cold_codec
+        )
+    
     async def add_message(self, session_id: str, role: str, content: str):
         """Add message to memory"""
-        if session_id not in self.conversation_buffer:
-            self.conversation_buffer[session_id] = deque(maxlen=self.config.max_memory_items)
-        
-        self.conversation_buffer[session_id].append({
+        history = self._append(session_id, {
             "role": role,
             "content": content,
             "timestamp": time.time()
         })
+        self.dirty_sessions.add(session_id)
+        
+        # Fold the message that just left the recent window into the summary
+        window = self.config.recent_window
+        if len(history) > window:
+            self.summarizer.enqueue(session_id, history.get(-window - 1))
+    
+    def _append(self, session_id: str, msg: Dict[str, Any]) -> ConversationHistory:
+        """Append to a session's history, keeping its count and index in step"""
+        if session_id not in self.conversation_buffer:
+            self.conversation_buffer[session_id] = self._new_history()
+        
+        history = self.conversation_buffer[session_id]
+        doc_id = self.message_counts.get(session_id, 0)
+        self.message_counts[session_id] = doc_id + 1
+        first_id = doc_id - len(history)
+        
+        evicted = history.append(msg)
+        
+        if self.config.keyword_recall_enabled:
+            index = self.indexes.setdefault(session_id, BM25Index())
+            index.add(doc_id, msg["content"])
+            # Keep the index in step with the history dropping its oldest messages
+            for offset, old in enumerate(evicted):
+                index.remove(first_id + offset, old["content"])
+        return history
     
     async def retrieve_context(self, session_id: str, query: str) -> Dict[str, Any]:
         """Retrieve relevant context"""
-        messages = list(self.conversation_buffer.get(session_id, []))
+        history = self.conversation_buffer.get(session_id)
+        if history is None:
+            history = self._new_history()
         return {
-            "recent_messages": messages[-10:] if messages else [],
+            "recent_messages": history.recent(self.config.recent_window),
+            "summary": self.summarizer.get_summary(session_id),
             "cached_data": {},
-            "relevant_memories": []
+            "relevant_memories": self._keyword_recall(session_id, query, history)
         }
     
+    def _keyword_recall(self, session_id: str, query: str,
+                        history: ConversationHistory) -> List[Dict[str, Any]]:
+        """BM25 top-k over messages that have left the recent window"""
+        index = self.indexes.get(session_id)
+        if index is None:
+            return []
+        
+        count = self.message_counts[session_id]
+        first_id = count - len(history)
+        recent = set(range(max(first_id, count - self.config.recent_window), count))
+        
+        memories = []
+        for doc_id, score in index.search(query, self.config.keyword_recall_top_k, recent):
+            # Only matches in cold blocks pay for decompression
+            msg = history.get(doc_id - first_id)
+            memories.append({
+                "role": msg["role"],
+                "content": msg["content"],
+                "timestamp": msg["timestamp"],
+                "score": round(score, 4)
+            })
+        return memories
+    
     async def update_long_term(self, session_id: str, user_message: str, 
                               ai_response: str, tool_results: Dict[str, Any]):
         """Update long-term memory"""
         pass
+    
+    def history_stats(self, session_id: str) -> Dict[str, Any]:
+        """Tier sizes, compression ratio and resident bytes for one session"""
+        history = self.conversation_buffer.get(session_id)
+        return history.stats() if history is not None else {}
+    
+    @property
+    def metrics(self) -> Dict[str, Any]:
+        """History totals across all sessions"""
+        totals = {"sessions": len(self.conversation_buffer), "messages": 0,
+                  "resident_bytes": 0, "cold_raw_bytes": 0, "cold_compressed_bytes": 0}
+        for history in self.conversation_buffer.values():
+            stats = history.stats()
+            for key in ("messages", "resident_bytes", "cold_raw_bytes", "cold_compressed_bytes"):
+                totals[key] += stats[key]
+        compressed = totals["cold_compressed_bytes"]
+        totals["compression_ratio"] = (
+            round(totals["cold_raw_bytes"] / compressed, 2) if compressed else None
+        )
+        return totals
+    
+    def export_state(self, full: bool = True) -> Dict[str, Any]:
+        """
+        Capture conversation state for a snapshot
+        
+        A full snapshot takes each history's cold blocks as the compressed
+        bytes they already are. A delta holds only the messages appended to
+        each dirty session since its last snapshot. Messages are never
+        mutated once stored, so they are passed by reference and serialised
+        off the event loop.
+        """
+        session_ids = list(self.conversation_buffer) if full else list(self.dirty_sessions)
+        self.dirty_sessions.clear()
+        
+        sessions = {}
+        for session_id in session_ids:
+            history = self.conversation_buffer[session_id]
+            count = self.message_counts.get(session_id, 0)
+            data = {
+                "count": count,
+                "summary": self.summarizer.get_summary(session_id),
+                "folded": self.summarizer.folded_counts.get(session_id, 0),
+                "pending": self.summarizer.unfolded(session_id)
+            }
+            if full:
+                data["history"] = history.export_tiers()
+            else:
+                data["appended"] = history.recent(count - self.snapshot_marks.get(session_id, 0))
+            self.snapshot_marks[session_id] = count
+            sessions[session_id] = data
+        return {"sessions": sessions}
+    
+    def import_state(self, state: Dict[str, Any]):
+        """Restore sessions from a snapshot, rebuilding derived indexes"""
+        for session_id, data in state.get("sessions", {}).items():
+            if "appended" in data:
+                # Delta: replay the new messages onto what is already restored
+                for msg in data["appended"]:
+                    self._append(session_id, msg)
+            else:
+                history = self._new_history()
+                if "history" in data:
+                    history.load_tiers(data["history"])
+                else:
+                    for msg in data["messages"]:
+                        history.append(msg)
+                self.conversation_buffer[session_id] = history
+                
+                if self.config.keyword_recall_enabled:
+                    index = BM25Index()
+                    first_id = data["count"] - len(history)
+                    for offset, msg in enumerate(history):
+                        index.add(first_id + offset, msg["content"])
+                    self.indexes[session_id] = index
+            
+            self.message_counts[session_id] = data["count"]
+            self.snapshot_marks[session_id] = data["count"]
+            if data["summary"]:
+                self.summarizer.summaries[session_id] = data["summary"]
+                self.summarizer.folded_counts[session_id] = data["folded"]
+            # Later snapshots supersede what earlier ones had queued
+            self.summarizer.pending[session_id] = list(data.get("pending", []))
+            self.summarizer.resume(session_id)
+    
+    async def shutdown(self):
+        """Stop background summarization"""
+        await self.summarizer.shutdown()
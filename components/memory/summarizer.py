@@ -0,0 +1,91 @@
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+import asyncio
+import re
+
+SummarizeFn = Callable[[str, List[Dict[str, Any]]], Awaitable[str]]
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+class RollingSummarizer:
+    """Folds messages that age out of the recent window into a per-session summary"""
+    
+    def __init__(self, config, summarize_fn: Optional[SummarizeFn] = None,
+                 on_update: Optional[Callable[[str], None]] = None):
+        self.config = config
+        self.summarize_fn = summarize_fn or self._extractive_summary
+        self.on_update = on_update  # called with the session id after each fold
+        self.summaries = {}  # session_id -> rolling summary text
+        self.folded_counts = {}  # session_id -> messages folded so far
+        self.pending = {}  # session_id -> messages waiting to be folded
+        self.folding = {}  # session_id -> messages being folded right now
+        self._tasks = {}  # session_id -> background fold task
+    
+    def enqueue(self, session_id: str, message: Dict[str, Any]):
+        """Queue an aged-out message and schedule a background fold"""
+        self.pending.setdefault(session_id, []).append(message)
+        self.resume(session_id)
+    
+    def resume(self, session_id: str):
+        """Schedule a fold if messages are waiting and none is running"""
+        task = self._tasks.get(session_id)
+        if self.pending.get(session_id) and (task is None or task.done()):
+            self._tasks[session_id] = asyncio.create_task(self._fold(session_id))
+    
+    def unfolded(self, session_id: str) -> List[Dict[str, Any]]:
+        """Messages that have left the recent window but aren't in the summary yet"""
+        return self.folding.get(session_id, []) + self.pending.get(session_id, [])
+    
+    def get_summary(self, session_id: str) -> str:
+        """Return the cached summary for a session"""
+        return self.summaries.get(session_id, "")
+    
+    async def flush(self, session_id: str):
+        """Wait until every queued message for a session has been folded"""
+        task = self._tasks.get(session_id)
+        if task is not None:
+            await task
+    
+    async def _fold(self, session_id: str):
+        """Fold pending messages into the summary, only touching the delta"""
+        while self.pending.get(session_id):
+            delta = self.folding[session_id] = self.pending.pop(session_id)
+            try:
+                summary = await self.summarize_fn(self.get_summary(session_id), delta)
+            except Exception as e:
+                # Skip the failed delta rather than retrying it forever
+                print(f"Summarization failed for {session_id}: {e}")
+                continue
+            finally:
+                self.folding.pop(session_id, None)
+            self.summaries[session_id] = summary
+            self.folded_counts[session_id] = self.folded_counts.get(session_id, 0) + len(delta)
+            if self.on_update:
+                self.on_update(session_id)
+    
+    async def _extractive_summary(self, previous: str, messages: List[Dict[str, Any]]) -> str:
+        """Default summarizer: keep the first sentence of each message"""
+        lines = [previous] if previous else []
+        for msg in messages:
+            content = " ".join(msg.get("content", "").split())
+            if not content:
+                continue
+            first = _SENTENCE_END.split(content, 1)[0][:200]
+            lines.append(f"{msg.get('role', 'user')}: {first}")
+        
+        summary = "\n".join(lines)
+        
+        # Drop the oldest lines once the summary outgrows its budget
+        max_chars = self.config.summary_max_chars
+        if len(summary) > max_chars:
+            summary = summary[-max_chars:]
+            newline = summary.find("\n")
+            if newline != -1:
+                summary = summary[newline + 1:]
+        return summary
+    
+    async def shutdown(self):
+        """Cancel outstanding fold tasks"""
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
+        self._tasks.clear()
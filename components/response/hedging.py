@@ -0,0 +1,112 @@
+from typing import Callable, AsyncGenerator
+from collections import deque
+import asyncio
+import math
+import time
+
+StreamFactory = Callable[[], AsyncGenerator[str, None]]
+
+class Hedger:
+    """
+    Hedges provider streams that stall before their first token
+    
+    If the primary stream has produced nothing after the hedge threshold
+    (the observed p95 time-to-first-token once enough samples exist), a
+    second request is started and whichever yields first is streamed; the
+    other is cancelled. A primary that fails before the threshold starts
+    the second request straight away. Hedging is skipped while the share
+    of recently hedged requests is at hedge_max_rate.
+    """
+    
+    def __init__(self, config):
+        self.config = config
+        self.ttft = deque(maxlen=config.hedge_sample_size)  # primary's first-token latencies
+        self.recent = deque(maxlen=100)  # True for each recent request that hedged
+        self.metrics = {"requests": 0, "hedged": 0, "hedge_wins": 0,
+                        "primary_wins": 0, "primary_failures": 0, "suppressed": 0}
+    
+    def threshold(self) -> float:
+        """Seconds to wait for a first token before hedging"""
+        if len(self.ttft) < self.config.hedge_min_samples:
+            return self.config.hedge_initial_delay
+        ordered = sorted(self.ttft)
+        return ordered[min(math.ceil(0.95 * len(ordered)) - 1, len(ordered) - 1)]
+    
+    def _may_hedge(self) -> bool:
+        if not self.recent:
+            return True
+        return sum(self.recent) / len(self.recent) < self.config.hedge_max_rate
+    
+    async def stream(self, primary: StreamFactory, hedge: StreamFactory) -> AsyncGenerator[str, None]:
+        """Stream from primary, or from hedge if it produces a first token sooner"""
+        self.metrics["requests"] += 1
+        started = {}
+        contenders = {}  # first-chunk task -> generator
+        
+        def launch(factory: StreamFactory):
+            gen = factory()
+            task = asyncio.ensure_future(gen.__anext__())
+            contenders[task] = gen
+            started[task] = time.monotonic()
+            return task
+        
+        primary_task = launch(primary)
+        winner = None
+        try:
+            done, _ = await asyncio.wait(contenders, timeout=self.threshold())
+            hedged = False
+            # An empty response is an answer, not a failure
+            failed = bool(done) and not isinstance(
+                primary_task.exception(), (type(None), StopAsyncIteration))
+            if failed:
+                self.metrics["primary_failures"] += 1
+            if not done or failed:
+                if self._may_hedge():
+                    hedged = True
+                    self.metrics["hedged"] += 1
+                    launch(hedge)
+                else:
+                    self.metrics["suppressed"] += 1
+            self.recent.append(hedged)
+            
+            # First contender to produce a chunk wins; failures fall through to the other
+            pending = set(contenders)
+            error = None
+            while winner is None and pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        break
+                    error = error or task.exception()
+            if winner is None:
+                if isinstance(error, StopAsyncIteration):
+                    return  # Empty response
+                raise error
+            
+            # The threshold tracks the primary: its time to first token, or how
+            # long it had stalled when the hedge beat it (a lower bound)
+            if not failed:
+                self.ttft.append(time.monotonic() - started[primary_task])
+            if winner is primary_task:
+                self.metrics["primary_wins"] += 1
+            else:
+                self.metrics["hedge_wins"] += 1
+            
+            await self._cancel_losers(contenders, winner)
+            yield winner.result()
+            async for chunk in contenders[winner]:
+                yield chunk
+        finally:
+            await self._cancel_losers(contenders, winner)
+            if winner is not None:
+                await contenders[winner].aclose()
+    
+    async def _cancel_losers(self, contenders, winner):
+        for task, gen in list(contenders.items()):
+            if task is winner:
+                continue
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await gen.aclose()
+            del contenders[task]
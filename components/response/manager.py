@@ -1,6 +1,10 @@
 from typing import Dict, Any, List, AsyncGenerator
 import asyncio
+import hashlib
 import json
+import time
+from .hedging import Hedger
+from .providers import MockProvider
 
 class ResponseManager:
     """Manages response generation and streaming"""
@@ -8,36 +12,58 @@ class ResponseManager:
     def __init__(self, config):
         self.config = config
         self.llm_client = None
+        self.providers = {}  # name -> object with an async stream(messages, **kwargs)
+        self.hedger = Hedger(config)
+        self.cache = None  # set by AIBrain; used when response_cache_ttl is set
+        self.metrics = {"cancelled_generations": 0, "hedging": self.hedger.metrics}
         
     async def initialize(self):
         """Initialize LLM client"""
         # For now, we'll use mock responses
         # Later you can add OpenAI/Anthropic here
-        pass
+        if self.config.model_provider not in self.providers:
+            self.register_provider(self.config.model_provider, MockProvider())
+    
+    def register_provider(self, name: str, provider):
+        """Make a provider available as the primary or hedge fallback"""
+        self.providers[name] = provider
     
     async def generate(self, **kwargs) -> AsyncGenerator[str, None]:
         """Generate streaming response"""
-        # Mock response for testing
         messages = self._build_messages(kwargs)
         
-        # Create a mock response based on the input
-        user_message = kwargs.get('message', '')
-        tool_results = kwargs.get('tool_results', {})
+        cache_key = None
+        if self.config.response_cache_ttl and self.cache:
+            cache_key = hashlib.sha256(json.dumps(
+                [self.config.model_name, messages], default=str).encode()).hexdigest()
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
         
-        # Build response
-        response = f"I received your message: '{user_message}'. "
+        primary = self.providers[self.config.model_provider]
+        fallback = self.providers.get(self.config.hedge_fallback_provider, primary)
         
-        if tool_results:
-            response += f"I used these tools: {', '.join(tool_results.keys())}. "
-            for tool, result in tool_results.items():
-                response += f"The {tool} returned: {result}. "
+        if self.config.hedging_enabled:
+            stream = self.hedger.stream(lambda: primary.stream(messages, **kwargs),
+                                        lambda: fallback.stream(messages, **kwargs))
+        else:
+            stream = primary.stream(messages, **kwargs)
         
-        response += "How else can I help you?"
+        chunks = []
+        try:
+            async for chunk in stream:
+                chunks.append(chunk)
+                yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            # Closing the stream below aborts the provider request
+            self.metrics["cancelled_generations"] += 1
+            raise
+        finally:
+            await stream.aclose()
         
-        # Stream the response character by character
-        for char in response:
-            yield char
-            await asyncio.sleep(0.01)  # Simulate streaming delay
+        if cache_key:
+            self.cache.set(cache_key, "".join(chunks), self.config.response_cache_ttl)
     
     def _build_messages(self, kwargs) -> List[Dict[str, str]]:
         """Build messages for LLM"""
@@ -50,6 +76,24 @@ class ResponseManager:
                 "content": kwargs['characteristics'].get('system_prompt', '')
             })
         
+        # Add rolling summary of older conversation
+        if kwargs.get('memory_context', {}).get('summary'):
+            messages.append({
+                "role": "system",
+                "content": f"Summary of earlier conversation:\n{kwargs['memory_context']['summary']}"
+            })
+        
+        # Add older messages recalled as relevant to this one
+        if kwargs.get('memory_context', {}).get('relevant_memories'):
+            recalled = "\n".join(
+                f"[{time.strftime('%Y-%m-%d %H:%M', time.localtime(m['timestamp']))}] {m['role']}: {m['content']}"
+                for m in kwargs['memory_context']['relevant_memories']
+            )
+            messages.append({
+                "role": "system",
+                "content": f"Earlier messages relevant to this one:\n{recalled}"
+            })
+        
         # Add conversation history
         if 'memory_context' in kwargs:
             for msg in kwargs['memory_context'].get('recent_messages', []):
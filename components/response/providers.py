@@ -0,0 +1,35 @@
+from typing import Dict, List, AsyncGenerator
+import asyncio
+
+class MockProvider:
+    """Local stand-in for a model provider, with injectable latency"""
+    
+    def __init__(self, first_token_delay: float = 0.0, chunk_delay: float = 0.01):
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+    
+    async def stream(self, messages: List[Dict[str, str]], **kwargs) -> AsyncGenerator[str, None]:
+        """Stream a canned reply describing the message and tool results"""
+        user_message = kwargs.get('message', '')
+        tool_results = kwargs.get('tool_results', {})
+        
+        # Build response
+        response = f"I received your message: '{user_message}'. "
+        
+        if tool_results:
+            response += f"I used these tools: {', '.join(tool_results.keys())}. "
+            for tool, result in tool_results.items():
+                if isinstance(result, dict) and result.get("circuit_open"):
+                    response += f"The {tool} tool is temporarily unavailable, so I answered without it. "
+                    continue
+                response += f"The {tool} returned: {result}. "
+        
+        response += "How else can I help you?"
+        
+        if self.first_token_delay:
+            await asyncio.sleep(self.first_token_delay)
+        
+        # Stream the response character by character
+        for char in response:
+            yield char
+            await asyncio.sleep(self.chunk_delay)  # Simulate streaming delay
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
 class BaseTool(ABC):
     """Base interface for all tools"""
@@ -16,6 +16,36 @@ class BaseTool(ABC):
         """Tool description"""
         pass
     
+    @property
+    def execution_mode(self) -> str:
+        """
+        Where the tool runs: async (event loop), thread or process
+        
+        Thread and process tools must also define a synchronous
+        run(params), which the worker pool calls instead of execute.
+        """
+        return "async"
+    
+    @property
+    def examples(self) -> List[str]:
+        """Sample user messages that need this tool, used to train routing"""
+        return []
+    
+    @property
+    def cacheable(self) -> bool:
+        """Whether results depend only on params, so they may be cached"""
+        return False
+    
+    @property
+    def produces(self) -> Optional[str]:
+        """Kind of data this tool's result is, e.g. 'documents'"""
+        return None
+    
+    @property
+    def consumes(self) -> Dict[str, str]:
+        """Params filled from another tool's result: param name -> data kind"""
+        return {}
+    
     @abstractmethod
     async def execute(self, params: Dict[str, Any]) -> Any:
         """Execute tool with parameters"""
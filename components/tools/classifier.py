@@ -0,0 +1,146 @@
+from typing import Dict, List, Tuple
+import asyncio
+import re
+import zlib
+import numpy as np
+
+# Messages that should route to no tool, used as shared negatives
+NEGATIVE_EXAMPLES = [
+    "hello", "hi there", "thanks", "thank you so much", "how are you",
+    "good morning", "tell me a joke", "what can you do", "ok great",
+    "can you help me write an email", "i feel tired today", "bye",
+]
+
+_WORD = re.compile(r"[a-z0-9']+")
+
+def _features(text: str) -> List[int]:
+    """Word unigrams, bigrams and in-word character trigrams as stable hashes"""
+    words = _WORD.findall(text.lower())
+    grams = [f"w:{w}" for w in words]
+    grams += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    for w in words:
+        padded = f"<{w}>"
+        grams += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    return [zlib.crc32(g.encode()) for g in grams]
+
+def featurize(texts: List[str], dim: int) -> np.ndarray:
+    """Hash texts into an L2-normalised (len(texts), dim) float32 matrix"""
+    X = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        hashes = _features(text)
+        if hashes:
+            np.add.at(X[row], np.array(hashes, dtype=np.uint32) % dim, 1.0)
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    return X / np.maximum(norms, 1e-6)
+
+class IntentClassifier:
+    """
+    One-vs-rest logistic model over hashed n-gram features
+    
+    Each tool gets its own yes/no weight row, so a message can route to
+    several tools, and scoring every tool is one matrix product. Training
+    data is the examples each tool declares, with the other tools'
+    examples and NEGATIVE_EXAMPLES as negatives.
+    """
+    
+    def __init__(self, dim: int = 4096):
+        self.dim = dim
+        self.labels = []
+        self.W = np.zeros((0, dim), dtype=np.float32)
+        self.b = np.zeros(0, dtype=np.float32)
+    
+    def fit(self, examples: Dict[str, List[str]], epochs: int = 200,
+            lr: float = 2.0, l2: float = 1e-4):
+        """Train on tool name -> example messages"""
+        self.labels = sorted(name for name, texts in examples.items() if texts)
+        texts, rows = [], []
+        for i, name in enumerate(self.labels):
+            texts += examples[name]
+            rows += [i] * len(examples[name])
+        texts += NEGATIVE_EXAMPLES
+        rows += [-1] * len(NEGATIVE_EXAMPLES)
+        
+        X = featurize(texts, self.dim)
+        Y = (np.array(rows)[:, None] == np.arange(len(self.labels))[None, :]).astype(np.float32)
+        # Positives are rare per tool, so weight them up to balance the loss
+        pos = Y.sum(axis=0)
+        weight = np.where(Y > 0, (len(texts) - pos) / np.maximum(pos, 1), 1.0).astype(np.float32)
+        
+        W = np.zeros((len(self.labels), self.dim), dtype=np.float32)
+        b = np.zeros(len(self.labels), dtype=np.float32)
+        for _ in range(epochs):
+            P = 1.0 / (1.0 + np.exp(-(X @ W.T + b)))
+            G = (P - Y) * weight / len(texts)
+            W -= lr * (G.T @ X + l2 * W)
+            b -= lr * G.sum(axis=0)
+        self.W, self.b = W, b
+    
+    def score(self, texts: List[str]) -> np.ndarray:
+        """Per-tool probabilities, shape (len(texts), len(labels))"""
+        X = featurize(texts, self.dim)
+        return 1.0 / (1.0 + np.exp(-(X @ self.W.T + self.b)))
+    
+    def decide(self, probs: np.ndarray) -> Tuple[List[str], float]:
+        """
+        Tools to run for one row of probabilities, and the confidence
+        
+        Confidence is how sure the model is about its least certain yes/no
+        decision, so one borderline tool is enough to lower it.
+        """
+        if not self.labels:
+            return [], 0.0
+        chosen = [name for name, p in zip(self.labels, probs) if p >= 0.5]
+        return chosen, float(np.maximum(probs, 1.0 - probs).min())
+
+class BatchScorer:
+    """
+    Coalesces concurrent classify calls into one scoring pass
+    
+    The first caller opens a batch that is scored on the next loop
+    iteration, so callers arriving in the same tick share it. A positive
+    batch_window instead holds the batch open that many seconds to gather
+    more. Either way a batch is scored as soon as max_batch are waiting.
+    """
+    
+    def __init__(self, classifier: IntentClassifier, batch_window: float = 0.0,
+                 max_batch: int = 64):
+        self.classifier = classifier
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.pending = []  # (text, future)
+        self.timer = None
+        self.metrics = {"batches": 0, "messages": 0}
+    
+    async def classify(self, text: str) -> Tuple[List[str], float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((text, future))
+        if len(self.pending) >= self.max_batch:
+            self._flush()
+        elif self.timer is None:
+            if self.batch_window > 0:
+                self.timer = loop.call_later(self.batch_window, self._flush)
+            else:
+                self.timer = loop.call_soon(self._flush)
+        return await future
+    
+    def _flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        
+        self.metrics["batches"] += 1
+        self.metrics["messages"] += len(batch)
+        try:
+            probs = self.classifier.score([text for text, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for row, (_, future) in zip(probs, batch):
+            if not future.done():  # Caller may have been cancelled
+                future.set_result(self.classifier.decide(row))
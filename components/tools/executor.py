@@ -0,0 +1,94 @@
+from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import asyncio
+import json
+from .base import BaseTool
+
+EXECUTION_MODES = ("async", "thread", "process")
+
+class WorkerPools:
+    """Lazily created thread and process pools, shareable between executors"""
+    
+    def __init__(self, thread_workers: int, process_workers: int):
+        self.thread_workers = thread_workers
+        self.process_workers = process_workers
+        self.thread_pool = None
+        self.process_pool = None
+    
+    def get(self, mode: str):
+        """Create pools lazily so servers without blocking tools pay nothing"""
+        if mode == "thread":
+            if self.thread_pool is None:
+                self.thread_pool = ThreadPoolExecutor(
+                    max_workers=self.thread_workers,
+                    thread_name_prefix="tool"
+                )
+            return self.thread_pool
+        if self.process_pool is None:
+            self.process_pool = ProcessPoolExecutor(
+                max_workers=self.process_workers
+            )
+        return self.process_pool
+    
+    def shutdown(self):
+        """Stop the worker pools without waiting on stuck jobs"""
+        for pool in (self.thread_pool, self.process_pool):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        self.thread_pool = None
+        self.process_pool = None
+
+class ToolExecutor:
+    """Dispatches tools to the event loop or to thread/process pools"""
+    
+    def __init__(self, config, pools: Optional[WorkerPools] = None):
+        self.config = config
+        # Shared pools belong to whoever created them and outlive this executor
+        self.owns_pools = pools is None
+        self.pools = pools or WorkerPools(config.tool_thread_workers, config.tool_process_workers)
+        self.metrics = {
+            mode: {"submitted": 0, "active": 0, "completed": 0, "failed": 0,
+                   "timed_out": 0, "oversized": 0}
+            for mode in EXECUTION_MODES
+        }
+    
+    async def run(self, tool: BaseTool, params: Dict[str, Any],
+                  timeout: Optional[float] = None) -> Any:
+        """Run a tool in its declared mode, enforcing timeout and result size"""
+        mode = tool.execution_mode
+        if mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode '{mode}' for tool '{tool.name}'")
+        
+        stats = self.metrics[mode]
+        stats["submitted"] += 1
+        stats["active"] += 1
+        try:
+            if mode == "async":
+                work = tool.execute(params)
+            else:
+                loop = asyncio.get_running_loop()
+                work = loop.run_in_executor(self.pools.get(mode), tool.run, params)
+            
+            # A timed-out pool job keeps its worker until it returns on its own
+            result = await asyncio.wait_for(work, timeout=timeout or self.config.tool_timeout)
+        except asyncio.TimeoutError:
+            stats["timed_out"] += 1
+            raise
+        except Exception:
+            stats["failed"] += 1
+            raise
+        finally:
+            stats["active"] -= 1
+        
+        size = len(json.dumps(result, default=str))
+        if size > self.config.tool_result_max_bytes:
+            stats["oversized"] += 1
+            return {"error": f"Tool result too large ({size} bytes)"}
+        
+        stats["completed"] += 1
+        return result
+    
+    def shutdown(self):
+        """Stop the worker pools unless they are shared"""
+        if self.owns_pools:
+            self.pools.shutdown()
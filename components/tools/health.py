@@ -0,0 +1,96 @@
+from typing import Dict, Any
+from collections import deque
+import math
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    """
+    Per-tool circuit breaker with an adaptive timeout
+    
+    Outcomes of the last tool_breaker_window calls decide the state: once
+    enough of them fail the breaker opens and calls fail fast. After the
+    cooldown a single probe call is let through (half-open); its outcome
+    closes the breaker again or re-opens it. The timeout tracks the p99
+    latency of recent successful calls instead of always using tool_timeout.
+    """
+    
+    def __init__(self, config):
+        self.config = config
+        self.state = CLOSED
+        self.outcomes = deque(maxlen=config.tool_breaker_window)  # True on success
+        self.latencies = deque(maxlen=config.tool_breaker_window)  # successful calls only
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.rejected = 0
+    
+    def allow(self) -> bool:
+        """Whether a call may go ahead right now"""
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.config.tool_breaker_cooldown:
+                self.rejected += 1
+                return False
+            self.state = HALF_OPEN
+        
+        if self.state == HALF_OPEN:
+            if self.probe_in_flight:
+                self.rejected += 1
+                return False
+            self.probe_in_flight = True
+        return True
+    
+    def retry_after(self) -> float:
+        """Seconds until an open breaker lets a probe through"""
+        remaining = self.config.tool_breaker_cooldown - (time.monotonic() - self.opened_at)
+        return round(max(remaining, 0.0), 2)
+    
+    def timeout(self) -> float:
+        """p99 of recent successful latencies times a margin, within bounds"""
+        ceiling = self.config.tool_timeout
+        if len(self.latencies) < self.config.tool_breaker_min_calls:
+            return ceiling
+        ordered = sorted(self.latencies)
+        p99 = ordered[min(math.ceil(0.99 * len(ordered)) - 1, len(ordered) - 1)]
+        return min(max(p99 * self.config.tool_timeout_multiplier,
+                       self.config.tool_min_timeout), ceiling)
+    
+    def record(self, success: bool, latency: float):
+        """Feed back a call outcome and update the state"""
+        self.outcomes.append(success)
+        if success:
+            self.latencies.append(latency)
+        
+        if self.state == HALF_OPEN:
+            self.probe_in_flight = False
+            if success:
+                self.state = CLOSED
+                self.outcomes.clear()
+            else:
+                self._open()
+            return
+        
+        failures = self.outcomes.count(False)
+        if (len(self.outcomes) >= self.config.tool_breaker_min_calls
+                and failures / len(self.outcomes) >= self.config.tool_breaker_failure_rate):
+            self._open()
+    
+    def abandon(self):
+        """A call was cancelled before it finished; it tells us nothing"""
+        if self.state == HALF_OPEN:
+            self.probe_in_flight = False
+    
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "calls": len(self.outcomes),
+            "failures": self.outcomes.count(False),
+            "rejected": self.rejected,
+            "timeout": round(self.timeout(), 3),
+        }
@@ -1,70 +1,213 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Union
 import asyncio
+import json
+import re
+import time
 from .base import BaseTool
+from .executor import ToolExecutor, WorkerPools, EXECUTION_MODES
+from .plan import ToolStep, run_plan, validate_plan
+from .health import CircuitBreaker
+from .classifier import IntentClassifier, BatchScorer
+
+# Fallback routing for tools without examples or low-confidence messages
+KEYWORD_RULES = {
+    "calculator": ["calculate", "compute", "math", "add", "subtract", "multiply", "divide"],
+    "search": ["search", "find", "look up", "what is", "who is"],
+    "weather": ["weather", "temperature", "forecast", "rain"],
+}
 
 class ToolManager:
     """Manages tool registration and execution"""
     
-    def __init__(self, config):
+    def __init__(self, config, pools: Optional[WorkerPools] = None):
         self.config = config
         self.tools = {}
+        self.executor = ToolExecutor(config, pools)
+        self.breakers = {}  # tool name -> CircuitBreaker
+        self.cache = None  # set by AIBrain; holds results of cacheable tools
+        self.scorer = BatchScorer(IntentClassifier(config.intent_feature_dim),
+                                  config.intent_batch_window, config.intent_max_batch)
+        self.classifier_stale = True  # retrain after tools change
+        self.training = None  # background task fitting the next classifier
+        self.metrics = {"cancelled_batches": 0, "pools": self.executor.metrics, "breakers": {},
+                        "routing": {"classified": 0, "fallback": 0, "scoring": self.scorer.metrics}}
         
     async def initialize(self):
         """Initialize tool system"""
         # Tools will be registered from outside
-        pass
+        self._schedule_training()
     
     def register_tool(self, tool: BaseTool):
         """Register a new tool"""
+        if tool.execution_mode not in EXECUTION_MODES:
+            raise ValueError(f"Tool '{tool.name}' has unknown execution mode '{tool.execution_mode}'")
+        if tool.execution_mode != "async" and not callable(getattr(tool, "run", None)):
+            raise ValueError(f"Tool '{tool.name}' runs in {tool.execution_mode} mode but defines no run(params)")
         self.tools[tool.name] = tool
+        self.classifier_stale = True
+        self._schedule_training()
         print(f"Registered tool: {tool.name}")
     
     async def analyze_requirements(self, message: str, context: Dict[str, Any], 
-                                  characteristics: Dict[str, Any]) -> List[str]:
-        """Analyze what tools are needed"""
-        # Simple keyword matching for now
-        required = []
-        
-        lower_msg = message.lower()
+                                  characteristics: Dict[str, Any]) -> Union[List[str], List[ToolStep]]:
+        """
+        Analyze what tools are needed
         
-        # Check for calculator needs
-        if any(word in lower_msg for word in ["calculate", "compute", "math", "add", "subtract", "multiply", "divide"]):
-            if "calculator" in self.tools:
-                required.append("calculator")
+        Returns either a flat list of tool names, or a list of ToolStep
+        nodes when later tools consume earlier tools' outputs.
+        """
+        keyword_tools = self._keyword_match(message)
+        self._schedule_training()
+        # Until the first training finishes, keywords route everything
+        if not self.config.intent_classifier_enabled or not self.scorer.classifier.labels:
+            return self.build_plan(keyword_tools)
         
-        # Check for search needs
-        if any(word in lower_msg for word in ["search", "find", "look up", "what is", "who is"]):
-            if "search" in self.tools:
-                required.append("search")
+        required, confidence = await self.scorer.classify(message)
+        if confidence < self.config.intent_confidence_threshold:
+            self.metrics["routing"]["fallback"] += 1
+            return self.build_plan(keyword_tools)
         
-        # Check for weather needs
-        if any(word in lower_msg for word in ["weather", "temperature", "forecast", "rain"]):
-            if "weather" in self.tools:
-                required.append("weather")
-                
-        return required
+        self.metrics["routing"]["classified"] += 1
+        # Tools that declare no examples can only be reached by keywords
+        trained = set(self.scorer.classifier.labels)
+        return self.build_plan(required + [name for name in keyword_tools if name not in trained])
     
-    async def execute_batch(self, tool_names: List[str], context: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute multiple tools"""
-        results = {}
+    def build_plan(self, tool_names: List[str]) -> Union[List[str], List[ToolStep]]:
+        """
+        Chain the chosen tools through the data kinds they consume and produce
+        
+        A tool that consumes a kind gets its param fed by the registered tool
+        producing that kind, which joins the plan if it wasn't chosen. When
+        nothing consumes anything, the deduplicated names are returned as is.
+        """
+        names = list(dict.fromkeys(tool_names))
+        producers = {tool.produces: name for name, tool in self.tools.items() if tool.produces}
+        
+        steps = {}
+        queue = list(names)
+        while queue:
+            name = queue.pop(0)
+            if name in steps or name not in self.tools:
+                continue
+            steps[name] = ToolStep(id=name, tool=name)
+            for param, kind in self.tools[name].consumes.items():
+                producer = producers.get(kind)
+                if producer and producer != name:
+                    steps[name].inputs[param] = producer
+                    queue.append(producer)
         
-        for tool_name in tool_names:
-            if tool_name in self.tools:
+        if not any(step.inputs for step in steps.values()):
+            return names
+        try:
+            validate_plan(list(steps.values()))
+        except ValueError as e:
+            # Circular declarations; run the chosen tools without chaining
+            print(f"Ignoring tool dependencies: {e}")
+            return names
+        return list(steps.values())
+    
+    def _keyword_match(self, message: str) -> List[str]:
+        """Tools whose keywords appear as whole words in the message"""
+        lower_msg = message.lower()
+        return [
+            name for name, words in KEYWORD_RULES.items()
+            if name in self.tools
+            and any(re.search(rf"\b{re.escape(word)}\b", lower_msg) for word in words)
+        ]
+    
+    def _schedule_training(self):
+        """Start retraining in the background if the tools changed"""
+        if not (self.config.intent_classifier_enabled and self.classifier_stale):
+            return
+        if self.training is not None and not self.training.done():
+            return  # The running task picks up the change when it finishes
+        try:
+            self.training = asyncio.get_running_loop().create_task(self._train())
+        except RuntimeError:
+            pass  # Registered before the loop started; initialize trains
+    
+    async def _train(self):
+        """Fit on the registered tools' examples off the event loop, then swap in"""
+        while self.classifier_stale:
+            self.classifier_stale = False
+            examples = {name: list(tool.examples) for name, tool in self.tools.items()}
+            classifier = IntentClassifier(self.config.intent_feature_dim)
+            if any(examples.values()):
                 try:
-                    # Execute tool with timeout
-                    result = await asyncio.wait_for(
-                        self.tools[tool_name].execute(context),
-                        timeout=self.config.tool_timeout
-                    )
-                    results[tool_name] = result
-                except asyncio.TimeoutError:
-                    results[tool_name] = {"error": "Tool execution timed out"}
+                    await asyncio.to_thread(classifier.fit, examples)
                 except Exception as e:
-                    results[tool_name] = {"error": str(e)}
-            else:
-                results[tool_name] = {"error": f"Tool '{tool_name}' not found"}
+                    print(f"Intent classifier training failed: {e}")
+                    return
+            self.scorer.classifier = classifier
+    
+    async def execute_batch(self, tool_names: Union[List[str], List[ToolStep]],
+                            context: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute multiple tools, or a tool plan, keyed by step id"""
+        # A flat list of names is a plan with no dependencies; a repeated name runs once
+        steps = [
+            item if isinstance(item, ToolStep) else ToolStep(id=item, tool=item)
+            for item in tool_names
+        ]
+        if not any(isinstance(step, ToolStep) for step in tool_names):
+            steps = list({step.id: step for step in steps}.values())
         
-        return results
+        try:
+            return await run_plan(steps, context, self._run_tool,
+                                  self.config.max_concurrent_tools)
+        except ValueError as e:
+            # An invalid plan is reported like a failed tool rather than failing the turn
+            return {"plan": {"error": str(e)}}
+        except asyncio.CancelledError:
+            # Every in-flight step has already been cancelled by run_plan
+            self.metrics["cancelled_batches"] += 1
+            raise
+    
+    async def _run_tool(self, tool_name: str, params: Dict[str, Any],
+                        timeout: Optional[float] = None) -> Any:
+        """Run a single tool, turning failures into error results"""
+        if tool_name not in self.tools:
+            return {"error": f"Tool '{tool_name}' not found"}
+        
+        tool = self.tools[tool_name]
+        cache_key = None
+        if tool.cacheable and self.cache:
+            cache_key = f"{tool_name}:{json.dumps(params, sort_keys=True, default=str)}"
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        breaker = self.breakers.get(tool_name)
+        if breaker is None:
+            breaker = self.breakers[tool_name] = CircuitBreaker(self.config)
+        
+        # Fail fast while the tool is known to be unhealthy
+        if not breaker.allow():
+            self.metrics["breakers"][tool_name] = breaker.stats()
+            return {
+                "error": f"Tool '{tool_name}' is temporarily unavailable",
+                "circuit_open": True,
+                "retry_after": breaker.retry_after()
+            }
+        
+        started = time.monotonic()
+        try:
+            # Execute tool in its declared mode with timeout
+            result = await self.executor.run(tool, params, timeout or breaker.timeout())
+            breaker.record(True, time.monotonic() - started)
+            if cache_key and result is not None:
+                self.cache.set(cache_key, result, self.config.tool_cache_ttl)
+            return result
+        except asyncio.CancelledError:
+            breaker.abandon()
+            raise
+        except asyncio.TimeoutError:
+            breaker.record(False, time.monotonic() - started)
+            return {"error": "Tool execution timed out"}
+        except Exception as e:
+            breaker.record(False, time.monotonic() - started)
+            return {"error": str(e)}
+        finally:
+            self.metrics["breakers"][tool_name] = breaker.stats()
     
     def list_tools(self) -> List[Dict[str, str]]:
         """List all available tools"""
@@ -72,3 +215,9 @@ class ToolManager:
             {"name": tool.name, "description": tool.description}
             for tool in self.tools.values()
         ]
+    
+    async def shutdown(self):
+        """Stop tool worker pools"""
+        if self.training is not None:
+            self.training.cancel()
+        self.executor.shutdown()
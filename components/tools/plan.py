@@ -0,0 +1,95 @@
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+from dataclasses import dataclass, field
+import asyncio
+import json
+
+@dataclass
+class ToolStep:
+    """A single node in a tool plan"""
+    id: str
+    tool: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    # Maps a parameter name to the id of the step whose output feeds it
+    inputs: Dict[str, str] = field(default_factory=dict)
+    timeout: Optional[float] = None
+
+RunTool = Callable[[str, Dict[str, Any], Optional[float]], Awaitable[Any]]
+
+def validate_plan(steps: List[ToolStep]):
+    """Reject duplicate ids, unknown dependencies and cycles"""
+    by_id = {}
+    for step in steps:
+        if step.id in by_id:
+            raise ValueError(f"Duplicate step id '{step.id}'")
+        by_id[step.id] = step
+    
+    visiting, done = set(), set()
+    
+    def visit(step_id: str):
+        if step_id in done:
+            return
+        if step_id in visiting:
+            raise ValueError(f"Tool plan has a cycle through '{step_id}'")
+        visiting.add(step_id)
+        for dep in by_id[step_id].inputs.values():
+            if dep not in by_id:
+                raise ValueError(f"Step '{step_id}' depends on unknown step '{dep}'")
+            visit(dep)
+        visiting.discard(step_id)
+        done.add(step_id)
+    
+    for step in steps:
+        visit(step.id)
+
+def _is_error(result: Any) -> bool:
+    return isinstance(result, dict) and "error" in result
+
+def _memo_key(tool: str, params: Dict[str, Any]) -> str:
+    return tool + ":" + json.dumps(params, sort_keys=True, default=str)
+
+async def run_plan(steps: List[ToolStep], context: Optional[Dict[str, Any]],
+                   run_tool: RunTool, max_concurrency: int) -> Dict[str, Any]:
+    """
+    Execute a tool plan as a DAG
+    
+    Every step starts as soon as the steps it consumes have resolved, so
+    independent branches run concurrently. Steps that resolve to the same
+    tool and parameters share a single execution.
+    """
+    validate_plan(steps)
+    
+    semaphore = asyncio.Semaphore(max_concurrency)
+    tasks = {}
+    memo = {}
+    
+    async def call(tool: str, params: Dict[str, Any], timeout: Optional[float]) -> Any:
+        async with semaphore:
+            return await run_tool(tool, params, timeout)
+    
+    async def run_step(step: ToolStep) -> Any:
+        params = dict(context or {})
+        params.update(step.params)
+        for name, dep in step.inputs.items():
+            value = await tasks[dep]
+            if _is_error(value):
+                return {"error": f"Dependency '{dep}' failed"}
+            params[name] = value
+        
+        key = _memo_key(step.tool, params)
+        if key not in memo:
+            memo[key] = asyncio.ensure_future(call(step.tool, params, step.timeout))
+        # Shielded so one consumer being cancelled doesn't cancel the shared call
+        return await asyncio.shield(memo[key])
+    
+    for step in steps:
+        tasks[step.id] = asyncio.ensure_future(run_step(step))
+    
+    try:
+        results = await asyncio.gather(*tasks.values())
+    finally:
+        # Cancelling the plan cancels every branch still in flight
+        for task in list(tasks.values()) + list(memo.values()):
+            if not task.done():
+                task.cancel()
+    
+    return dict(zip(tasks.keys(), results))
@@ -1,6 +1,7 @@
 from typing import Dict, Any, Optional, AsyncGenerator
 import asyncio
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
+import hashlib
 from datetime import datetime
 
 @dataclass
@@ -17,6 +18,13 @@ class BrainConfig:
     cache_ttl: int = 3600
     vector_db_url: Optional[str] = None
     max_memory_items: int = 1000
+    recent_window: int = 10
+    summary_max_chars: int = 2000
+    keyword_recall_enabled: bool = True
+    keyword_recall_top_k: int = 5
+    hot_history_size: int = 50  # older messages are packed into compressed blocks
+    cold_block_size: int = 50
+    cold_codec: str = "zlib"  # zlib or lzma
     
     # AI Model
     model_provider: str = "openai"  # openai, anthropic, local
@@ -27,10 +35,42 @@ class BrainConfig:
     stream_enabled: bool = True
     max_conversation_length: int = 100
     response_timeout: int = 30
+    hedging_enabled: bool = False  # race a second request when the first token is slow
+    hedge_fallback_provider: Optional[str] = None  # None hedges against the primary again
+    hedge_initial_delay: float = 1.0  # used until enough first-token samples exist
+    hedge_min_samples: int = 20
+    hedge_sample_size: int = 200
+    hedge_max_rate: float = 0.1  # at most this share of recent requests may hedge
     
     # Tools
     max_concurrent_tools: int = 5
     tool_timeout: int = 10
+    tool_thread_workers: int = 4
+    tool_process_workers: int = 2
+    tool_result_max_bytes: int = 1_000_000
+    tool_breaker_window: int = 20
+    tool_breaker_min_calls: int = 5
+    tool_breaker_failure_rate: float = 0.5
+    tool_breaker_cooldown: float = 30.0
+    tool_timeout_multiplier: float = 2.0  # adaptive timeout = p99 latency x this
+    tool_min_timeout: float = 0.5
+    intent_classifier_enabled: bool = True  # route with a model trained on tool examples
+    intent_confidence_threshold: float = 0.7  # below this, fall back to keyword rules
+    intent_feature_dim: int = 4096
+    intent_batch_window: float = 0.0  # >0 holds batches open this long; 0 batches within a loop tick
+    intent_max_batch: int = 64
+    
+    # Caches
+    shared_cache_name: Optional[str] = None  # shared memory segment for all workers; None keeps caches per process
+    shared_cache_slots: int = 4096
+    shared_cache_slot_size: int = 4096  # larger values are not cached
+    tool_cache_ttl: int = 300  # only for tools that declare themselves cacheable
+    response_cache_ttl: int = 0  # 0 disables caching whole responses
+    
+    # Snapshots
+    snapshot_dir: Optional[str] = None  # None disables warm restarts
+    snapshot_interval: int = 30
+    snapshot_full_every: int = 10
 
 class AIBrain:
     """
@@ -38,10 +78,15 @@ class AIBrain:
     This is the main class you'll instantiate for any AI application
     """
     
-    def __init__(self, config: BrainConfig):
+    def __init__(self, config: BrainConfig, resources=None):
         self.config = config
+        self.resources = resources  # SharedResources when hosted in a BrainRegistry
         self.components = {}
         self._initialized = False
+        self.cancel_hooks = []
+        self.metrics = {"cancelled_requests": 0}
+        self.snapshots = None
+        self.cache = None
         
     async def initialize(self):
         """Initialize all brain components"""
@@ -59,12 +104,34 @@ class AIBrain:
         self.components['memory'] = MemoryManager(self.config)
         self.components['characteristics'] = CharacteristicsManager(self.config)
         self.components['response'] = ResponseManager(self.config)
-        self.components['tools'] = ToolManager(self.config)
+        self.components['tools'] = ToolManager(
+            self.config, self.resources.worker_pools if self.resources else None
+        )
+        
+        # Caches components opt into; shared by all workers when shared_cache_name is set
+        from .shared_cache import create_cache
+        if self.resources:
+            self.cache = self.resources.get_or_create(
+                "cache", self.config.shared_cache_name or "local", lambda: create_cache(self.config)
+            )
+        else:
+            self.cache = create_cache(self.config)
+        # Entries written under another config (e.g. an older deploy still draining) stay invisible
+        generation = hashlib.sha256(repr(asdict(self.config)).encode()).hexdigest()[:16]
+        for name in ('tools', 'response'):
+            self.components[name].cache = self.cache.namespace(f"{self.config.app_name}:{name}", generation)
         
         # Initialize all components
         for component in self.components.values():
             await component.initialize()
         
+        # Resume warm sessions from the last snapshot
+        if self.config.snapshot_dir:
+            from .snapshot import SnapshotManager
+            self.snapshots = SnapshotManager(self.config, self.components)
+            await self.snapshots.load()
+            self.snapshots.start()
+        
         self._initialized = True
         
     async def process(self, 
@@ -101,6 +168,26 @@ class AIBrain:
             session.id, memory_context
         )
         
+        turn = self._run_turn(session, message, memory_context, characteristics, context)
+        try:
+            async for chunk in turn:
+                yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            # Client went away mid-turn; let cleanup hooks release anything held
+            self.metrics["cancelled_requests"] += 1
+            for hook in self.cancel_hooks:
+                try:
+                    await hook(session, message)
+                except Exception as e:
+                    print(f"Cancel hook failed: {e}")
+            raise
+        finally:
+            await turn.aclose()
+    
+    async def _run_turn(self, session, message: str, memory_context: Dict[str, Any],
+                        characteristics: Dict[str, Any],
+                        context: Optional[Dict[str, Any]]) -> AsyncGenerator[str, None]:
+        """Run tools and stream the model response for a single turn"""
         # Determine required tools
         required_tools = await self.components['tools'].analyze_requirements(
             message, memory_context, characteristics
@@ -114,22 +201,48 @@ class AIBrain:
             )
         
         # Generate response
-        async for chunk in self.components['response'].generate(
+        stream = self.components['response'].generate(
             message=message,
             session=session,
             memory_context=memory_context,
             characteristics=characteristics,
             tool_results=tool_results
-        ):
-            yield chunk
+        )
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            # Close the provider stream even if the consumer stopped early
+            await stream.aclose()
         
         # Update long-term memory
         await self.components['memory'].update_long_term(
             session.id, message, tool_results
         )
     
+    def add_cancel_hook(self, hook):
+        """Register an async callback run when a turn is abandoned mid-flight"""
+        self.cancel_hooks.append(hook)
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Collect metrics from the brain and every component that exposes them"""
+        metrics = {"brain": dict(self.metrics)}
+        if self.snapshots:
+            metrics["snapshots"] = dict(self.snapshots.metrics)
+        if self.cache:
+            metrics["cache"] = self.cache.get_metrics()
+        for name, component in self.components.items():
+            if hasattr(component, 'metrics'):
+                metrics[name] = dict(component.metrics)
+        return metrics
+    
     async def shutdown(self):
         """Gracefully shutdown all components"""
+        if self.snapshots:
+            await self.snapshots.shutdown()
         for component in self.components.values():
             if hasattr(component, 'shutdown'):
                 await component.shutdown()
+        # A registry's shared resources close its cache
+        if self.cache and not self.resources:
+            self.cache.close()
@@ -18,6 +18,37 @@ class Settings(BaseSettings):
     api_host: str = "0.0.0.0"
     api_port: int = 8000
     
+    # Multi-app hosting; requests without an app_id go to app_name
+    app_max_concurrent_requests: Optional[int] = None
+    tool_thread_workers: int = 4  # worker pools shared by every hosted app
+    tool_process_workers: int = 2
+    
+    # Idempotency
+    idempotency_ttl: int = 600
+    idempotency_max_entries: int = 10000
+    idempotency_grace: int = 30  # seconds a keyed turn outlives its disconnected client
+    
+    # Caches; set shared_cache_name to share them across uvicorn workers
+    shared_cache_name: Optional[str] = None
+    shared_cache_slots: int = 4096
+    shared_cache_slot_size: int = 4096
+    tool_cache_ttl: int = 300
+    response_cache_ttl: int = 0  # 0 disables caching whole responses
+    
+    # Warm restarts; snapshots are off unless a directory is set
+    snapshot_dir: Optional[str] = None
+    snapshot_interval: int = 30
+    snapshot_full_every: int = 10
+    
+    # WebSocket send queues
+    ws_send_queue_size: int = 256
+    ws_slow_consumer_policy: str = "coalesce"  # coalesce, summary, disconnect
+    ws_stall_threshold: float = 5.0
+    ws_max_streams: int = 4
+    
+    # Admin endpoints (profiling); disabled unless a token is set
+    admin_token: Optional[str] = None
+    
     class Config:
         env_file = ".env"
 
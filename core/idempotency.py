@@ -0,0 +1,158 @@
+from typing import Optional, AsyncGenerator, Callable
+from collections import OrderedDict
+import asyncio
+import time
+
+class IdempotencyConflictError(Exception):
+    """Raised when an idempotency key is reused for a different request"""
+    pass
+
+class SharedStream:
+    """
+    A single generation that any number of subscribers can follow
+    
+    When the last subscriber leaves, the generation keeps running for
+    grace seconds so a retry can still attach to it; only then is it
+    cancelled and marked abandoned.
+    """
+    
+    def __init__(self, source: AsyncGenerator[str, None], on_finish: Callable[["SharedStream"], None],
+                 grace: float = 0, fingerprint: Optional[str] = None):
+        self.fingerprint = fingerprint
+        self.grace = grace
+        self.chunks = []
+        self.error = None
+        self.done = False
+        self.abandoned = False
+        self.subscribers = 0
+        self._source = source
+        self._on_finish = on_finish
+        self._changed = asyncio.Condition()
+        self._expiry = None
+        self._task = asyncio.create_task(self._pump())
+    
+    async def _pump(self):
+        """Drain the source into the shared chunk buffer"""
+        try:
+            async for chunk in self._source:
+                async with self._changed:
+                    self.chunks.append(chunk)
+                    self._changed.notify_all()
+        except BaseException as e:
+            self.error = e
+        finally:
+            await self._source.aclose()
+            async with self._changed:
+                self.done = True
+                self._changed.notify_all()
+            self._on_finish(self)
+    
+    async def subscribe(self) -> AsyncGenerator[str, None]:
+        """Replay what has been generated so far, then follow live chunks"""
+        self.subscribers += 1
+        if self._expiry is not None:
+            self._expiry.cancel()
+            self._expiry = None
+        position = 0
+        try:
+            while True:
+                async with self._changed:
+                    await self._changed.wait_for(lambda: self.done or position < len(self.chunks))
+                    pending = self.chunks[position:]
+                    finished = self.done
+                for chunk in pending:
+                    yield chunk
+                position += len(pending)
+                if finished and position == len(self.chunks):
+                    break
+            if self.error is not None:
+                raise self.error
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                if self.grace > 0:
+                    self._expiry = asyncio.get_running_loop().call_later(self.grace, self._abandon)
+                else:
+                    self._abandon()
+    
+    def _abandon(self):
+        """Nobody is listening any more; stop paying for the generation"""
+        self._expiry = None
+        if self.subscribers == 0 and not self.done:
+            self.abandoned = True
+            self._task.cancel()
+
+class IdempotencyStore:
+    """
+    Deduplicates retried requests by idempotency key
+    
+    Completed responses are kept in a bounded TTL store and replayed.
+    A retry that arrives while the original is still generating attaches
+    to the same SharedStream instead of starting a new turn; this holds
+    for grace seconds after the original client disconnected too. Each
+    key remembers a fingerprint of its request, and reusing the key for
+    a different request raises IdempotencyConflictError.
+    """
+    
+    def __init__(self, ttl: int = 600, max_entries: int = 10000, grace: float = 30):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.grace = grace
+        self.completed = OrderedDict()  # key -> (expires_at, fingerprint, text)
+        self.in_flight = {}  # key -> SharedStream
+        self.metrics = {"replayed": 0, "attached": 0, "started": 0, "conflicts": 0}
+    
+    def _lookup(self, key: str):
+        entry = self.completed.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self.completed[key]
+            return None
+        return entry
+    
+    def _store(self, key: str, fingerprint: Optional[str], text: str):
+        self.completed[key] = (time.monotonic() + self.ttl, fingerprint, text)
+        self.completed.move_to_end(key)
+        while len(self.completed) > self.max_entries:
+            self.completed.popitem(last=False)
+    
+    def _check(self, fingerprint: Optional[str], stored: Optional[str]):
+        if fingerprint != stored:
+            self.metrics["conflicts"] += 1
+            raise IdempotencyConflictError("Idempotency key was already used for a different request")
+    
+    async def stream(self, key: str, factory: Callable[[], AsyncGenerator[str, None]],
+                     fingerprint: Optional[str] = None) -> AsyncGenerator[str, None]:
+        """Stream the response for key, running factory() at most once"""
+        entry = self._lookup(key)
+        if entry is not None:
+            self._check(fingerprint, entry[1])
+            self.metrics["replayed"] += 1
+            yield entry[2]
+            return
+        
+        shared = self.in_flight.get(key)
+        if shared is None or shared.abandoned:
+            self.metrics["started"] += 1
+            shared = SharedStream(factory(), lambda s: self._finish(key, s),
+                                  self.grace, fingerprint)
+            self.in_flight[key] = shared
+        else:
+            self._check(fingerprint, shared.fingerprint)
+            self.metrics["attached"] += 1
+        
+        subscription = shared.subscribe()
+        try:
+            async for chunk in subscription:
+                yield chunk
+        finally:
+            await subscription.aclose()
+    
+    def _finish(self, key: str, shared: SharedStream):
+        """Move a finished generation out of the in-flight map"""
+        if self.in_flight.get(key) is shared:
+            del self.in_flight[key]
+        # Only successful responses are replayed; failures may be retried
+        if shared.error is None:
+            self._store(key, shared.fingerprint, "".join(shared.chunks))
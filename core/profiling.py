@@ -0,0 +1,138 @@
+from typing import Dict, Any, List, Optional
+from collections import Counter
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+# Repository root, so same-named directories in site-packages don't match
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _repo_path(filename: str) -> Optional[str]:
+    """Path relative to REPO_ROOT with forward slashes, or None if outside it"""
+    try:
+        relative = os.path.relpath(os.path.abspath(filename), REPO_ROOT)
+    except ValueError:  # Different drive on Windows
+        return None
+    if relative.startswith(".."):
+        return None
+    return relative.replace("\\", "/")
+
+def _frame_label(frame) -> str:
+    # Every component has a manager.py, so the basename alone would merge them
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{_repo_path(code.co_filename) or code.co_filename}:{name}"
+
+def component_for(filename: str) -> str:
+    """Attribute a source file to a brain component"""
+    relative = _repo_path(filename)
+    if relative is None:
+        return "other"
+    parts = relative.split("/")
+    if parts[0] == "components" and len(parts) > 2:
+        return parts[1]
+    if parts[0] == "core":
+        return "core"
+    return "other"
+
+class SamplingProfiler:
+    """
+    Samples one thread's stack from a background thread
+    
+    Nothing runs until profile() is called, so there is no cost when idle.
+    Output is in collapsed-stack format ("a;b;c count"), which flamegraph
+    tools consume directly.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+    
+    @property
+    def active(self) -> bool:
+        return self._lock.locked()
+    
+    def profile(self, thread_id: int, seconds: float, interval: float) -> str:
+        """Sample thread_id every interval for seconds; blocks the caller"""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            stacks = Counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                frame = sys._current_frames().get(thread_id)
+                if frame is not None:
+                    labels = []
+                    while frame is not None:
+                        labels.append(_frame_label(frame))
+                        frame = frame.f_back
+                    stacks[";".join(reversed(labels))] += 1
+                time.sleep(interval)
+        finally:
+            self._lock.release()
+        
+        return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+
+class AllocationTracker:
+    """On-demand tracemalloc snapshots grouped by component"""
+    
+    def __init__(self, frames: int = 1):
+        self.frames = frames
+        self.previous = None
+    
+    @property
+    def active(self) -> bool:
+        return tracemalloc.is_tracing()
+    
+    def start(self):
+        """Begin tracing allocations; costs nothing until called"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self.previous = None
+    
+    def stop(self):
+        """Stop tracing and forget the diff baseline"""
+        tracemalloc.stop()
+        self.previous = None
+    
+    def snapshot(self, limit: int = 20) -> Dict[str, Any]:
+        """Current allocations by component, plus the diff since the last call"""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("Allocation tracking is not running")
+        
+        current = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        stats = current.statistics("filename")
+        
+        by_component = Counter()
+        for stat in stats:
+            by_component[component_for(stat.traceback[0].filename)] += stat.size
+        
+        result = {
+            "traced_bytes": tracemalloc.get_traced_memory()[0],
+            "by_component": dict(by_component.most_common()),
+            "top": self._format(stats[:limit]),
+            "diff": None
+        }
+        if self.previous is not None:
+            diff = current.compare_to(self.previous, "filename")
+            result["diff"] = [
+                {**entry, "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+                for entry, stat in zip(self._format(diff[:limit]), diff[:limit])
+            ]
+        self.previous = current
+        return result
+    
+    def _format(self, stats: List[Any]) -> List[Dict[str, Any]]:
+        return [
+            {
+                "file": stat.traceback[0].filename,
+                "component": component_for(stat.traceback[0].filename),
+                "size": stat.size,
+                "count": stat.count
+            }
+            for stat in stats
+        ]
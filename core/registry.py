@@ -0,0 +1,110 @@
+from typing import Dict, Any, Optional, AsyncGenerator, Callable
+import inspect
+from components.tools.executor import WorkerPools
+from .brain import AIBrain, BrainConfig
+
+class QuotaExceededError(Exception):
+    """Raised when an app is already running its maximum number of turns"""
+    pass
+
+class UnknownAppError(Exception):
+    """Raised when no brain is registered under the requested app id"""
+    pass
+
+class SharedResources:
+    """Heavy resources shared by every brain hosted in this process"""
+    
+    def __init__(self, thread_workers: int = 8, process_workers: int = 4):
+        self.worker_pools = WorkerPools(thread_workers, process_workers)
+        self._resources = {}  # (kind, key) -> resource
+    
+    def get_or_create(self, kind: str, key: str, factory: Callable[[], Any]) -> Any:
+        """
+        Return the shared resource for (kind, key), creating it once
+        
+        Used for anything expensive that apps with the same settings can
+        share, e.g. kind="llm_client", key=provider or kind="db", key=url.
+        """
+        if (kind, key) not in self._resources:
+            self._resources[(kind, key)] = factory()
+        return self._resources[(kind, key)]
+    
+    async def shutdown(self):
+        """Close shared resources and stop the worker pools"""
+        for resource in self._resources.values():
+            for method in ("aclose", "close", "dispose"):
+                if hasattr(resource, method):
+                    result = getattr(resource, method)()
+                    if inspect.isawaitable(result):
+                        await result
+                    break
+        self._resources.clear()
+        self.worker_pools.shutdown()
+
+class BrainRegistry:
+    """
+    Hosts many named brains in one process
+    
+    Each app keeps its own BrainConfig (prompts, tools, model) but tool
+    worker pools and other heavy resources come from one SharedResources.
+    Per-app quotas cap how many turns an app may run concurrently.
+    """
+    
+    def __init__(self, resources: Optional[SharedResources] = None):
+        self.resources = resources or SharedResources()
+        self.brains = {}
+        self.quotas = {}  # app_id -> max concurrent turns, None for unlimited
+        self.metrics = {}  # app_id -> counters
+    
+    async def register(self, app_id: str, config: BrainConfig,
+                       max_concurrent_requests: Optional[int] = None) -> AIBrain:
+        """Create, initialize and register a brain for app_id"""
+        if app_id in self.brains:
+            raise ValueError(f"App '{app_id}' is already registered")
+        
+        brain = AIBrain(config, resources=self.resources)
+        await brain.initialize()
+        self.brains[app_id] = brain
+        self.quotas[app_id] = max_concurrent_requests
+        self.metrics[app_id] = {"requests": 0, "active": 0, "rejected": 0}
+        return brain
+    
+    def get(self, app_id: str) -> AIBrain:
+        """Look up the brain for an app"""
+        if app_id not in self.brains:
+            raise UnknownAppError(f"Unknown app '{app_id}'")
+        return self.brains[app_id]
+    
+    async def process(self, app_id: str, user_id: str, message: str,
+                      context: Optional[Dict[str, Any]] = None) -> AsyncGenerator[str, None]:
+        """Route a turn to the app's brain, enforcing its concurrency quota"""
+        brain = self.get(app_id)
+        stats = self.metrics[app_id]
+        quota = self.quotas[app_id]
+        if quota is not None and stats["active"] >= quota:
+            stats["rejected"] += 1
+            raise QuotaExceededError(f"App '{app_id}' is at its limit of {quota} concurrent requests")
+        
+        stats["requests"] += 1
+        stats["active"] += 1
+        stream = brain.process(user_id, message, context)
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            stats["active"] -= 1
+            await stream.aclose()
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Per-app quota counters alongside each brain's own metrics"""
+        return {
+            app_id: {**self.metrics[app_id], "quota": self.quotas[app_id], **brain.get_metrics()}
+            for app_id, brain in self.brains.items()
+        }
+    
+    async def shutdown(self):
+        """Shut down every brain, then the resources they shared"""
+        for brain in self.brains.values():
+            await brain.shutdown()
+        self.brains.clear()
+        await self.resources.shutdown()
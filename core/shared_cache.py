@@ -0,0 +1,279 @@
+from typing import Dict, Any, Optional
+from collections import OrderedDict
+from contextlib import contextmanager
+from multiprocessing import shared_memory, resource_tracker
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows runs a single worker; a process lock is enough
+    fcntl = None
+
+HEADER = struct.Struct(">4sIII")  # magic, version, slots, slot size
+MAX_WORKERS = 64
+WORKERS = struct.Struct(f">{MAX_WORKERS}I")  # pids attached to the segment, 0 when free
+SLOT = struct.Struct(">IQddIII")  # seq, key hash, expires at, written at, key len, value len, crc
+MAGIC = b"CAIC"
+VERSION = 2
+PROBE = 8  # slots searched per key
+
+def _stats() -> Dict[str, int]:
+    return {"hits": 0, "misses": 0, "sets": 0, "evictions": 0, "too_large": 0}
+
+class CacheNamespace:
+    """
+    One component's view of a cache; keys never collide across namespaces
+    
+    Keys are also prefixed with generation, so workers running a different
+    configuration never read each other's entries.
+    """
+    
+    def __init__(self, cache, name: str, generation: str = ""):
+        self.cache = cache
+        self.name = name
+        self.generation = generation
+    
+    def get(self, key: str) -> Any:
+        return self.cache.get(self.name, f"{self.generation}:{key}")
+    
+    def set(self, key: str, value: Any, ttl: float):
+        self.cache.set(self.name, f"{self.generation}:{key}", value, ttl)
+
+class _Cache:
+    """JSON values, namespaces and per-namespace stats on top of a byte store"""
+    
+    def __init__(self):
+        self.stats = {}  # namespace -> counters, for this process
+    
+    def namespace(self, name: str, generation: str = "") -> CacheNamespace:
+        self.stats.setdefault(name, _stats())
+        return CacheNamespace(self, name, generation)
+    
+    def get(self, namespace: str, key: str) -> Any:
+        """Cached value, or None on a miss"""
+        stats = self.stats.setdefault(namespace, _stats())
+        raw = self._get(f"{namespace}\0{key}".encode())
+        if raw is None:
+            stats["misses"] += 1
+            return None
+        stats["hits"] += 1
+        return json.loads(raw)
+    
+    def set(self, namespace: str, key: str, value: Any, ttl: float):
+        """Cache a JSON-serialisable value for ttl seconds"""
+        stats = self.stats.setdefault(namespace, _stats())
+        raw = json.dumps(value, separators=(",", ":"), default=str).encode()
+        stored, evicted = self._set(f"{namespace}\0{key}".encode(), raw, ttl)
+        if not stored:
+            stats["too_large"] += 1
+            return
+        stats["sets"] += 1
+        stats["evictions"] += evicted
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__, "namespaces": {k: dict(v) for k, v in self.stats.items()}}
+    
+    def close(self):
+        pass
+
+class LocalCache(_Cache):
+    """Per-process LRU cache; the default when no shared cache is configured"""
+    
+    def __init__(self, max_entries: int = 4096):
+        super().__init__()
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (expires at, raw)
+    
+    def _get(self, key: bytes) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+    
+    def _set(self, key: bytes, raw: bytes, ttl: float):
+        self.entries[key] = (time.time() + ttl, raw)
+        self.entries.move_to_end(key)
+        evicted = 0
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            evicted += 1
+        return True, evicted
+
+class SharedMemoryCache(_Cache):
+    """
+    Cache shared by every worker process on the host
+    
+    A fixed-size hash table of slots in one shared memory segment. A key
+    may live in any of PROBE slots after its hash; when all are taken the
+    oldest write is replaced. Reads take no lock: each slot carries a
+    sequence number that writers make odd while they write, so a reader
+    that sees it change (or a bad checksum) treats the read as a miss.
+    Writers serialise on a lock file.
+    
+    The segment lives only as long as its workers: each registers its pid
+    in the header, and the last one to close unlinks it. A segment left
+    behind by workers that crashed is wiped by the next one to attach, so
+    a full restart or deploy never serves entries from the old code.
+    """
+    
+    def __init__(self, name: str, slots: int = 4096, slot_size: int = 4096):
+        super().__init__()
+        if slot_size <= SLOT.size:
+            raise ValueError(f"slot_size must be larger than {SLOT.size} bytes")
+        self.name = name
+        self.slots = slots
+        self.slot_size = slot_size
+        self._thread_lock = threading.Lock()
+        self._lock_file = open(os.path.join(tempfile.gettempdir(), f"{name}.lock"), "a+b")
+        
+        size = HEADER.size + WORKERS.size + slots * slot_size
+        with self._locked():
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+                HEADER.pack_into(self.shm.buf, 0, MAGIC, VERSION, slots, slot_size)
+            except FileExistsError:
+                self.shm = shared_memory.SharedMemory(name=name)
+                if bytes(self.shm.buf[:HEADER.size]) != HEADER.pack(MAGIC, VERSION, slots, slot_size):
+                    self.shm.close()
+                    self._lock_file.close()
+                    raise ValueError(f"Shared cache '{name}' exists with a different layout")
+            # Lifetime is managed through the worker table, not this process's exit
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+            self.buf = self.shm.buf
+            
+            workers = [pid for pid in WORKERS.unpack_from(self.buf, HEADER.size) if _alive(pid)]
+            if not workers:
+                # Nobody is attached: anything here is from a previous run
+                start = HEADER.size + WORKERS.size
+                self.buf[start:start + slots * slot_size] = bytes(slots * slot_size)
+            if len(workers) >= MAX_WORKERS:
+                raise ValueError(f"Shared cache '{name}' already has {MAX_WORKERS} workers")
+            self._write_workers(workers + [os.getpid()])
+    
+    def _write_workers(self, workers):
+        WORKERS.pack_into(self.buf, HEADER.size, *(workers + [0] * (MAX_WORKERS - len(workers))))
+    
+    @contextmanager
+    def _locked(self):
+        """Exclude other writers, in this process and in other workers"""
+        with self._thread_lock:
+            if fcntl:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+    
+    def _offset(self, index: int) -> int:
+        return HEADER.size + WORKERS.size + index * self.slot_size
+    
+    def _hash(self, key: bytes) -> int:
+        # Python's hash() differs per process, so use a stable digest
+        return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "big") or 1
+    
+    def _read(self, index: int, key: bytes, key_hash: int) -> Optional[bytes]:
+        offset = self._offset(index)
+        seq, h, expires, _, key_len, value_len, crc = SLOT.unpack_from(self.buf, offset)
+        if seq & 1 or h != key_hash or key_len != len(key):
+            return None
+        start = offset + SLOT.size
+        payload = bytes(self.buf[start:start + key_len + value_len])
+        if SLOT.unpack_from(self.buf, offset)[0] != seq or zlib.crc32(payload) != crc:
+            return None  # Torn by a concurrent write
+        if payload[:key_len] != key or expires < time.time():
+            return None
+        return payload[key_len:]
+    
+    def _get(self, key: bytes) -> Optional[bytes]:
+        key_hash = self._hash(key)
+        for i in range(PROBE):
+            raw = self._read((key_hash + i) % self.slots, key, key_hash)
+            if raw is not None:
+                return raw
+        return None
+    
+    def _set(self, key: bytes, raw: bytes, ttl: float):
+        if SLOT.size + len(key) + len(raw) > self.slot_size:
+            return False, 0
+        key_hash = self._hash(key)
+        now = time.time()
+        
+        with self._locked():
+            # Same key, else a free or expired slot, else the oldest write
+            target, target_age = None, None
+            for i in range(PROBE):
+                index = (key_hash + i) % self.slots
+                _, h, expires, written, key_len, _, _ = SLOT.unpack_from(self.buf, self._offset(index))
+                if h == key_hash and self._read(index, key, key_hash) is not None:
+                    target, target_age = index, None
+                    break
+                # Free slots sort before any live one
+                age = 0.0 if key_len == 0 or expires < now else written
+                if target is None or age < target_age:
+                    target, target_age = index, age
+            evicted = int(bool(target_age))
+            
+            offset = self._offset(target)
+            seq = SLOT.unpack_from(self.buf, offset)[0]
+            payload = key + raw
+            SLOT.pack_into(self.buf, offset, seq + 1, 0, 0.0, 0.0, 0, 0, 0)
+            self.buf[offset + SLOT.size:offset + SLOT.size + len(payload)] = payload
+            SLOT.pack_into(self.buf, offset, seq + 2, key_hash, now + ttl, now,
+                           len(key), len(raw), zlib.crc32(payload))
+            return True, evicted
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        now = time.time()
+        live = 0
+        for i in range(self.slots):
+            _, _, expires, _, key_len, _, _ = SLOT.unpack_from(self.buf, self._offset(i))
+            live += bool(key_len) and expires >= now
+        return {**super().get_metrics(), "slots": self.slots, "live_slots": live}
+    
+    def close(self):
+        """Detach from the segment, unlinking it if this was the last worker"""
+        with self._locked():
+            workers = [pid for pid in WORKERS.unpack_from(self.buf, HEADER.size) if _alive(pid)]
+            if os.getpid() in workers:
+                workers.remove(os.getpid())  # One entry per attached instance
+            self._write_workers(workers)
+            self.buf = None
+            self.shm.close()
+            if not workers:
+                # Re-register so unlink's own unregister call is balanced
+                resource_tracker.register(self.shm._name, "shared_memory")
+                self.shm.unlink()
+        self._lock_file.close()
+
+def _alive(pid: int) -> bool:
+    if pid == 0:
+        return False
+    if os.name == "nt":
+        # os.kill would terminate it; Windows frees the segment with its last handle anyway
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Exists, owned by another user
+    return True
+
+def create_cache(config):
+    """Shared cache when shared_cache_name is set, otherwise a local one"""
+    if config.shared_cache_name:
+        return SharedMemoryCache(config.shared_cache_name, config.shared_cache_slots,
+                                 config.shared_cache_slot_size)
+    return LocalCache(config.shared_cache_slots)
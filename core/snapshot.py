@@ -0,0 +1,174 @@
+from typing import Dict, Any, List, Optional
+import asyncio
+import base64
+import glob
+import json
+import os
+import struct
+import zlib
+
+# File layout: magic, format version, kind, sequence, then zlib-compressed JSON
+MAGIC = b"CAIS"
+FORMAT_VERSION = 1
+KIND_FULL = 0
+KIND_DELTA = 1
+_HEADER = struct.Struct(">4sBBQ")
+
+def _encode_value(value: Any) -> Any:
+    # Bytes (e.g. already-compressed history blocks) are stored as base64
+    if isinstance(value, bytes):
+        return {"__bytes__": base64.b64encode(value).decode()}
+    return str(value)
+
+def _decode_object(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1 and "__bytes__" in obj:
+        return base64.b64decode(obj["__bytes__"])
+    return obj
+
+def encode_snapshot(kind: int, sequence: int, state: Dict[str, Any]) -> bytes:
+    """Serialize component state into the snapshot binary format"""
+    body = zlib.compress(json.dumps(state, separators=(",", ":"), default=_encode_value).encode(), 6)
+    return _HEADER.pack(MAGIC, FORMAT_VERSION, kind, sequence) + body
+
+def decode_snapshot(data: bytes):
+    """Parse a snapshot file, returning (kind, sequence, state)"""
+    magic, version, kind, sequence = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a snapshot file")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}")
+    state = json.loads(zlib.decompress(data[_HEADER.size:]), object_hook=_decode_object)
+    return kind, sequence, state
+
+class SnapshotManager:
+    """
+    Periodically snapshots component state so restarts resume warm
+    
+    Every component exposing export_state/import_state takes part. A full
+    snapshot is followed by delta snapshots holding only what changed
+    since the previous write; loading replays the full snapshot and then
+    every newer delta in order.
+    """
+    
+    def __init__(self, config, components: Dict[str, Any]):
+        self.config = config
+        self.components = components
+        self.directory = config.snapshot_dir
+        self.sequence = 0
+        self.deltas_since_full = 0
+        self._force_full = True
+        self._task = None
+        self.metrics = {"full_snapshots": 0, "delta_snapshots": 0,
+                        "failed_snapshots": 0, "last_snapshot_bytes": 0}
+    
+    def _participants(self) -> Dict[str, Any]:
+        return {
+            name: component for name, component in self.components.items()
+            if hasattr(component, 'export_state') and hasattr(component, 'import_state')
+        }
+    
+    def _path(self, kind: int, sequence: int) -> str:
+        name = "full.snap" if kind == KIND_FULL else f"delta-{sequence:012d}.snap"
+        return os.path.join(self.directory, name)
+    
+    async def load(self):
+        """Restore the latest full snapshot and the deltas written after it"""
+        full_path = self._path(KIND_FULL, 0)
+        if not os.path.exists(full_path):
+            return
+        
+        files = [full_path] + sorted(glob.glob(os.path.join(self.directory, "delta-*.snap")))
+        snapshots = await asyncio.to_thread(self._read_files, files)
+        if not snapshots:
+            return
+        
+        _, base_sequence, _ = snapshots[0]
+        participants = self._participants()
+        for kind, sequence, state in snapshots:
+            # Deltas older than the full snapshot are leftovers from before it
+            if kind == KIND_DELTA and sequence <= base_sequence:
+                continue
+            for name, component_state in state.items():
+                if name in participants:
+                    participants[name].import_state(component_state)
+            self.sequence = max(self.sequence, sequence)
+        print(f"Restored snapshot {self.sequence} from {self.directory}")
+    
+    def _read_files(self, paths: List[str]):
+        snapshots = []
+        for path in paths:
+            try:
+                with open(path, "rb") as f:
+                    snapshots.append(decode_snapshot(f.read()))
+            except (OSError, ValueError, zlib.error) as e:
+                print(f"Skipping unreadable snapshot {path}: {e}")
+        return snapshots
+    
+    async def snapshot(self, full: Optional[bool] = None):
+        """Capture state on the loop, then compress and write it off-loop"""
+        if full is None:
+            full = self._force_full or self.deltas_since_full >= self.config.snapshot_full_every
+        
+        # Copying state is the only part that runs on the event loop
+        state = {name: component.export_state(full=full)
+                 for name, component in self._participants().items()}
+        if not full and not any(part.get("sessions") for part in state.values()):
+            return  # Nothing changed since the last snapshot
+        self.sequence += 1
+        kind = KIND_FULL if full else KIND_DELTA
+        
+        try:
+            size = await asyncio.to_thread(self._write, kind, self.sequence, state)
+        except Exception as e:
+            # Dirty tracking was already reset, so only a full snapshot is safe next
+            self._force_full = True
+            self.metrics["failed_snapshots"] += 1
+            print(f"Snapshot failed: {e}")
+            return
+        
+        self.metrics["last_snapshot_bytes"] = size
+        if full:
+            self._force_full = False
+            self.deltas_since_full = 0
+            self.metrics["full_snapshots"] += 1
+        else:
+            self.deltas_since_full += 1
+            self.metrics["delta_snapshots"] += 1
+    
+    def _write(self, kind: int, sequence: int, state: Dict[str, Any]) -> int:
+        data = encode_snapshot(kind, sequence, state)
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(kind, sequence)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        
+        # A new full snapshot supersedes every earlier delta
+        if kind == KIND_FULL:
+            for old in glob.glob(os.path.join(self.directory, "delta-*.snap")):
+                os.remove(old)
+        return len(data)
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.config.snapshot_interval)
+            await self.snapshot()
+    
+    def start(self):
+        """Begin periodic snapshots in the background"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def shutdown(self):
+        """Stop the background task and write a final full snapshot"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.snapshot(full=True)
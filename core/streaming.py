@@ -0,0 +1,129 @@
+from typing import Dict, Any, Optional
+from collections import deque
+import asyncio
+import time
+import weakref
+
+# What to do with new chunks once a connection's send queue is full
+POLICIES = ("coalesce", "summary", "disconnect")
+
+class SlowConsumerError(Exception):
+    """Raised to abort generation for a client that cannot keep up"""
+    pass
+
+# Shared across every connection in this process
+metrics = {
+    "connections": 0,
+    "queued_frames": 0,
+    "max_queue_depth": 0,
+    "coalesced_chunks": 0,
+    "dropped_chunks": 0,
+    "slow_disconnects": 0,
+    "stalled_sends": 0,
+}
+
+_live_queues = weakref.WeakSet()
+
+def get_metrics() -> Dict[str, Any]:
+    """Counters plus current queue depth and connections stuck mid-send"""
+    now = time.monotonic()
+    queues = list(_live_queues)
+    return {
+        **metrics,
+        "queue_depth": sum(len(q.frames) for q in queues),
+        "stalled_connections": sum(
+            1 for q in queues
+            if q.send_started is not None and now - q.send_started > q.stall_threshold
+        ),
+    }
+
+class SendQueue:
+    """
+    Bounded per-connection frame queue drained by its own writer task
+    
+    Generation only ever calls put(), which never waits on the socket.
+    Control frames (ack, complete, error) are always queued; chunk frames
+    are subject to the slow-consumer policy once max_size is reached.
+    """
+    
+    def __init__(self, websocket, max_size: int, policy: str, stall_threshold: float):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown slow consumer policy '{policy}'")
+        self.websocket = websocket
+        self.max_size = max_size
+        self.policy = policy
+        self.stall_threshold = stall_threshold
+        self.frames = deque()
+        self.error = None
+        self.send_started = None
+        self._ready = asyncio.Event()
+        self._writer = asyncio.create_task(self._write())
+        metrics["connections"] += 1
+        _live_queues.add(self)
+    
+    def put(self, frame: Dict[str, Any]) -> bool:
+        """Queue a frame; returns False if a chunk was dropped by the policy"""
+        if self.error is not None:
+            raise self.error
+        
+        if frame.get("type") == "chunk" and len(self.frames) >= self.max_size:
+            if self.policy == "disconnect":
+                metrics["slow_disconnects"] += 1
+                self.error = SlowConsumerError("Client is not reading fast enough")
+                self._disconnect()
+                raise self.error
+            if self.policy == "coalesce":
+                last = self.frames[-1]
+                if last.get("type") == "chunk" and last.get("stream_id") == frame.get("stream_id"):
+                    last["content"] += frame["content"]
+                    metrics["coalesced_chunks"] += 1
+                    return True
+            # summary, or nothing to coalesce with
+            metrics["dropped_chunks"] += 1
+            return False
+        
+        self.frames.append(frame)
+        metrics["queued_frames"] += 1
+        metrics["max_queue_depth"] = max(metrics["max_queue_depth"], len(self.frames))
+        self._ready.set()
+        return True
+    
+    def _disconnect(self):
+        """Drop queued frames and close the socket as 'try again later'"""
+        self.frames.clear()
+        self._writer.cancel()
+        asyncio.create_task(self.websocket.close(code=1013))
+    
+    async def _write(self):
+        try:
+            while True:
+                await self._ready.wait()
+                while self.frames:
+                    frame = self.frames.popleft()
+                    self.send_started = time.monotonic()
+                    await self.websocket.send_json(frame)
+                    if time.monotonic() - self.send_started > self.stall_threshold:
+                        metrics["stalled_sends"] += 1
+                    self.send_started = None
+                self._ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = e
+    
+    async def close(self, timeout: Optional[float] = None):
+        """Give queued frames up to timeout seconds to flush, then stop the writer"""
+        if self not in _live_queues:
+            return
+        if timeout and self.error is None:
+            deadline = time.monotonic() + timeout
+            while ((self.frames or self.send_started is not None)
+                   and not self._writer.done() and time.monotonic() < deadline):
+                await asyncio.sleep(0.01)
+        self._writer.cancel()
+        try:
+            await self._writer
+        except asyncio.CancelledError:
+            pass
+        metrics["connections"] -= 1
+        _live_queues.discard(self)